@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:28
+
+from django.db import migrations, models
+
+
+def backfill_avatars(apps, schema_editor):
+    """Point avatars at the latest application photo; thumbnails come later
+    from `manage.py generate_image_variants --avatars`."""
+    User = apps.get_model('accounts', 'User')
+    EnrollmentApplication = apps.get_model('courses', 'EnrollmentApplication')
+    latest = {}
+    applications = (
+        EnrollmentApplication.objects.exclude(photo='').exclude(photo__isnull=True)
+        .order_by('user_id', '-created_at').values_list('user_id', 'photo')
+    )
+    for user_id, photo in applications:
+        latest.setdefault(user_id, photo)
+    for user_id, photo in latest.items():
+        User.objects.filter(pk=user_id).update(avatar=photo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_google_id'),
+        ('courses', '0014_dashboard_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='student_photos/'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(backfill_avatars, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_avatar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, editable=False, null=True, upload_to='student_photos/'),
+        ),
+    ]
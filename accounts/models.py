@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import default_storage
 from django.core.validators import RegexValidator
 from django.utils import timezone
 from datetime import timedelta
@@ -19,6 +20,9 @@ class User(AbstractUser):
     is_student = models.BooleanField(default=True)
     email_verified = models.BooleanField(default=False)
     google_id = models.CharField(max_length=255, blank=True, null=True, unique=True, help_text="Google account ID for OAuth")
+    # Latest enrollment application photo, kept in sync by courses.tasks.refresh_user_avatar
+    avatar = models.ImageField(upload_to='student_photos/', blank=True, null=True, editable=False, db_index=True)
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -27,6 +31,24 @@ class User(AbstractUser):
     
     def __str__(self):
         return self.email
+    
+    # Square thumbnail sizes kept for the avatar (list rows and page headers, at 2x)
+    AVATAR_SIZES = (96, 320)
+    
+    def avatar_url(self, size):
+        """URL of the avatar thumbnail for size, falling back to the original"""
+        name = (self.avatar_thumbnails or {}).get('jpeg', {}).get(str(size))
+        if name:
+            return default_storage.url(name)
+        return self.avatar.url if self.avatar else ''
+    
+    @property
+    def avatar_small_url(self):
+        return self.avatar_url(96)
+    
+    @property
+    def avatar_large_url(self):
+        return self.avatar_url(320)
 
 
 class EmailOTP(models.Model):
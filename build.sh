@@ -9,6 +9,9 @@ echo "Building Django application..."
 pip install --upgrade pip
 pip install -r requirements.txt
 
+# Poster frames and lighter renditions for the static videos (needs ffmpeg)
+python manage.py build_video_assets || true
+
 # Collect static files (including videos)
 python manage.py collectstatic --noinput || true
 
@@ -19,6 +22,10 @@ ls -la staticfiles/media/*.mp4 2>/dev/null || echo "Videos will be served from s
 # Run migrations (skip if DATABASE_URL not set during build)
 if [ -n "$DATABASE_URL" ]; then
     python manage.py migrate --noinput
+    # The shared cache table (see CACHES in settings.py)
+    python manage.py createcachetable
+    # Pre-render cached pages so the first visitors don't all render them
+    python manage.py warm_page_cache
 else
     echo "DATABASE_URL not set, skipping migrations (will run on first start)"
 fi
@@ -1,21 +1,41 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import Language, CourseLevel, Enrollment, EnrollmentApplication, ClassSchedule, Certificate, Invoice
+from django.utils import timezone
+from .models import Language, CourseLevel, Enrollment, EnrollmentApplication, ApplicationLineItem, ClassSchedule, Certificate, Invoice
+from .dashboard_cache import ENROLLMENTS, INVOICES, APPLICATIONS, invalidate_dashboard
+from .provisioning import provision_enrollments
+from .tasks import run_in_background, generate_language_image_variants
+
+
+def update_with_dashboards(queryset, user_field, kind, **changes):
+    """queryset.update() that also refreshes the affected students' dashboards"""
+    # Collect users first: the update may move rows out of the filtered queryset
+    user_ids = list(queryset.values_list(user_field, flat=True))
+    # update() skips auto_now; the dashboard API's ?since= relies on updated_at
+    changes.setdefault('updated_at', timezone.now())
+    updated = queryset.update(**changes)
+    invalidate_dashboard(user_ids, kind)
+    return updated
 
 
 @admin.register(Language)
 class LanguageAdmin(admin.ModelAdmin):
     list_display = ['name', 'flag_emoji', 'category', 'levels_count', 'created_at']
     list_filter = ['category', 'created_at']
-    search_fields = ['name', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['name', 'aliases', 'description']
+    readonly_fields = ['created_at', 'updated_at', 'price_range']
     
     def levels_count(self, obj):
-        count = obj.levels.count()
-        return format_html('<strong>{}</strong>', count)
+        return format_html('<strong>{}</strong>', obj.levels_count)
     levels_count.short_description = 'Course Levels'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image_file' in form.changed_data:
+            run_in_background(generate_language_image_variants, obj.id)
 
 
 @admin.register(CourseLevel)
@@ -25,7 +45,7 @@ class CourseLevelAdmin(admin.ModelAdmin):
     search_fields = ['language__name', 'level']
     
     def price_display(self, obj):
-        return format_html('<strong>₹{:,}</strong>', obj.price)
+        return format_html('<strong>₹{}</strong>', f'{obj.price:,}')
     price_display.short_description = 'Price'
     
     def enrollments_count(self, obj):
@@ -91,25 +111,60 @@ class EnrollmentAdmin(admin.ModelAdmin):
     progress_bar.short_description = 'Progress'
     
     def mark_active(self, request, queryset):
-        queryset.update(status='active')
+        update_with_dashboards(queryset, 'user_id', ENROLLMENTS, status='active')
     mark_active.short_description = 'Mark selected as Active'
     
     def mark_completed(self, request, queryset):
-        queryset.update(status='completed')
+        update_with_dashboards(queryset, 'user_id', ENROLLMENTS, status='completed')
     mark_completed.short_description = 'Mark selected as Completed'
     
     def mark_cancelled(self, request, queryset):
-        queryset.update(status='cancelled')
+        update_with_dashboards(queryset, 'user_id', ENROLLMENTS, status='cancelled')
     mark_cancelled.short_description = 'Mark selected as Cancelled'
 
 
+class ApplicationLineItemInline(admin.TabularInline):
+    model = ApplicationLineItem
+    extra = 0
+    fields = ['level', 'unit_price', 'tax_amount']
+
+
+class ApplicationStatusFilter(admin.SimpleListFilter):
+    """Status filter that leaves drafts out unless they are asked for"""
+    title = 'status'
+    parameter_name = 'status'
+    
+    def lookups(self, request, model_admin):
+        return [('all', 'All, including drafts')] + EnrollmentApplication.STATUS_CHOICES
+    
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All but drafts',
+        }
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+    
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset.exclude(status='draft')
+        if self.value() == 'all':
+            return queryset
+        return queryset.filter(status=self.value())
+
+
 @admin.register(EnrollmentApplication)
 class EnrollmentApplicationAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'email_display', 'language_badge', 'status_badge', 'payment_status_badge', 'total_amount_display', 'created_at']
-    list_filter = ['status', 'payment_status', 'language', 'created_at', 'submitted_at']
+    list_filter = [ApplicationStatusFilter, 'payment_status', 'language', 'created_at', 'submitted_at']
     search_fields = ['full_name', 'email', 'phone_number', 'user__email']
     readonly_fields = ['created_at', 'updated_at', 'submitted_at', 'paid_at', 'document_links']
-    filter_horizontal = ['levels']
+    inlines = [ApplicationLineItemInline]
     actions = ['approve_applications', 'reject_applications', 'mark_payment_success']
     
     fieldsets = (
@@ -117,7 +172,7 @@ class EnrollmentApplicationAdmin(admin.ModelAdmin):
             'fields': ('user', 'full_name', 'email', 'phone_number', 'date_of_birth', 'address', 'photo')
         }),
         ('Course Details', {
-            'fields': ('language', 'levels', 'total_amount', 'schedule_type', 'preferred_hour')
+            'fields': ('language', 'total_amount', 'schedule_type', 'preferred_hour')
         }),
         ('Documents', {
             'fields': ('verification_document', 'signature', 'document_links')
@@ -136,6 +191,9 @@ class EnrollmentApplicationAdmin(admin.ModelAdmin):
     email_display.short_description = 'Email'
     
     def language_badge(self, obj):
+        if obj.language is None:
+            # Drafts may not have picked a language yet
+            return '-'
         return format_html(
             '<span style="font-size: 18px;">{} {}</span>',
             obj.language.flag_emoji,
@@ -175,15 +233,17 @@ class EnrollmentApplicationAdmin(admin.ModelAdmin):
     payment_status_badge.short_description = 'Payment'
     
     def total_amount_display(self, obj):
-        return format_html('<strong>₹{:,}</strong>', obj.total_amount)
+        return format_html('<strong>₹{}</strong>', f'{obj.total_amount:,}')
     total_amount_display.short_description = 'Amount'
     
     def document_links(self, obj):
         links = []
         if obj.photo:
             links.append(format_html(
-                '<a href="{}" target="_blank" style="display: inline-block; margin: 5px; padding: 8px 16px; background: #9C27B0; color: white; text-decoration: none; border-radius: 4px;">📷 View Photo</a>',
-                obj.photo.url
+                '<a href="{}" target="_blank" style="display: inline-block; margin: 5px; padding: 8px 16px; background: #9C27B0; color: white; text-decoration: none; border-radius: 4px;">📷 View Photo</a>'
+                '<img src="{}" alt="" loading="lazy" style="height: 60px; margin: 5px; vertical-align: middle; border-radius: 4px;">',
+                obj.photo.url,
+                obj.photo_thumbnail_url
             ))
         if obj.verification_document:
             links.append(format_html(
@@ -192,26 +252,48 @@ class EnrollmentApplicationAdmin(admin.ModelAdmin):
             ))
         if obj.signature:
             links.append(format_html(
-                '<a href="{}" target="_blank" style="display: inline-block; margin: 5px; padding: 8px 16px; background: #2196F3; color: white; text-decoration: none; border-radius: 4px;">✍️ View Signature</a>',
-                obj.signature.url
+                '<a href="{}" target="_blank" style="display: inline-block; margin: 5px; padding: 8px 16px; background: #2196F3; color: white; text-decoration: none; border-radius: 4px;">✍️ View Signature</a>'
+                '<img src="{}" alt="" loading="lazy" style="height: 60px; margin: 5px; vertical-align: middle; border-radius: 4px; background: #fff;">',
+                obj.signature.url,
+                obj.signature_thumbnail_url
             ))
         return mark_safe(''.join(links)) if links else 'No documents'
     document_links.short_description = 'Documents'
     
     def approve_applications(self, request, queryset):
-        queryset.update(status='approved')
-        self.message_user(request, f"{queryset.count()} applications approved.")
+        # Read the selection first: the changelist's filters (e.g. status) may no longer match after the update
+        selected = list(queryset.values_list('pk', 'status', 'payment_status'))
+        ids = [pk for pk, status, _ in selected if status != 'draft']
+        unpaid = sum(1 for _, status, payment_status in selected if status != 'draft' and payment_status != 'success')
+        drafts = len(selected) - len(ids)
+        with transaction.atomic():
+            update_with_dashboards(EnrollmentApplication.objects.filter(pk__in=ids), 'user_id', APPLICATIONS, status='approved')
+            # Approving is the staff's call, so unpaid (e.g. paid offline) applications are enrolled too
+            provisioned = provision_enrollments(ids, paid_only=False)
+        self.message_user(request, f"{len(ids)} applications approved, {provisioned} course enrollments provisioned.")
+        if unpaid:
+            self.message_user(
+                request,
+                f"{unpaid} of them have no successful payment; their students were enrolled anyway.",
+                messages.WARNING,
+            )
+        if drafts:
+            self.message_user(request, f"{drafts} draft applications were skipped; students must submit them first.", messages.WARNING)
     approve_applications.short_description = 'Approve selected applications'
     
     def reject_applications(self, request, queryset):
-        queryset.update(status='rejected')
+        update_with_dashboards(queryset, 'user_id', APPLICATIONS, status='rejected')
         self.message_user(request, f"{queryset.count()} applications rejected.")
     reject_applications.short_description = 'Reject selected applications'
     
     def mark_payment_success(self, request, queryset):
         from django.utils import timezone
-        queryset.update(payment_status='success', paid_at=timezone.now())
-        self.message_user(request, f"Payment marked as success for {queryset.count()} applications.")
+        ids = list(queryset.exclude(status='draft').values_list('pk', flat=True))
+        with transaction.atomic():
+            update_with_dashboards(EnrollmentApplication.objects.filter(pk__in=ids), 'user_id', APPLICATIONS, payment_status='success', paid_at=timezone.now())
+            # Applications approved before they were paid are enrolled now
+            provision_enrollments(ids)
+        self.message_user(request, f"Payment marked as success for {len(ids)} applications.")
     mark_payment_success.short_description = 'Mark payment as success'
 
 
@@ -250,7 +332,7 @@ class InvoiceAdmin(admin.ModelAdmin):
     enrollment_info.short_description = 'Enrollment'
     
     def total_amount_display(self, obj):
-        return format_html('<strong>₹{:,}</strong>', obj.total_amount)
+        return format_html('<strong>₹{}</strong>', f'{obj.total_amount:,}')
     total_amount_display.short_description = 'Amount'
     
     def status_badge(self, obj):
@@ -270,12 +352,12 @@ class InvoiceAdmin(admin.ModelAdmin):
     
     def mark_paid(self, request, queryset):
         from django.utils import timezone
-        queryset.update(status='paid', paid_date=timezone.now().date())
+        update_with_dashboards(queryset, 'enrollment__user_id', INVOICES, status='paid', paid_date=timezone.now().date())
         self.message_user(request, f"{queryset.count()} invoices marked as paid.")
     mark_paid.short_description = 'Mark selected as Paid'
     
     def mark_overdue(self, request, queryset):
-        queryset.update(status='overdue')
+        update_with_dashboards(queryset, 'enrollment__user_id', INVOICES, status='overdue')
         self.message_user(request, f"{queryset.count()} invoices marked as overdue.")
     mark_overdue.short_description = 'Mark selected as Overdue'
 
@@ -1,6 +1,7 @@
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
 from django.http import JsonResponse
@@ -8,9 +9,11 @@ from django.conf import settings
 from django.core.files import File
 from accounts.models import User
 from .models import (
-    Language, CourseLevel, Enrollment, EnrollmentApplication,
+    Language, CourseLevel, Enrollment, EnrollmentApplication, ApplicationLineItem,
     ClassSchedule, Certificate, Invoice
 )
+from .provisioning import provision_enrollments
+from .tasks import run_in_background, generate_language_image_variants
 
 
 def get_price_for_level(level_code, category):
@@ -70,7 +73,7 @@ def admin_dashboard(request):
         'total_enrollments': Enrollment.objects.count(),
         'active_enrollments': Enrollment.objects.filter(status='active').count(),
         'pending_applications': EnrollmentApplication.objects.filter(status__in=['submitted', 'payment_pending']).count(),
-        'total_applications': EnrollmentApplication.objects.count(),
+        'total_applications': EnrollmentApplication.objects.exclude(status='draft').count(),
         'total_revenue': EnrollmentApplication.objects.filter(payment_status='success').aggregate(
             total=Sum('total_amount')
         )['total'] or 0,
@@ -82,8 +85,8 @@ def admin_dashboard(request):
         'student_users': User.objects.filter(is_student=True).count(),
     }
     
-    # Recent applications
-    recent_applications = EnrollmentApplication.objects.select_related(
+    # Recent applications; drafts are forms still being filled in
+    recent_applications = EnrollmentApplication.objects.exclude(status='draft').select_related(
         'user', 'language'
     ).prefetch_related('levels').order_by('-created_at')[:10]
     
@@ -93,7 +96,7 @@ def admin_dashboard(request):
     ).order_by('-enrolled_at')[:10]
     
     # Applications by status
-    applications_by_status = EnrollmentApplication.objects.values('status').annotate(
+    applications_by_status = EnrollmentApplication.objects.exclude(status='draft').values('status').annotate(
         count=Count('id')
     )
     
@@ -132,8 +135,11 @@ def admin_applications(request):
         'user', 'language'
     ).prefetch_related('levels').all()
     
+    # Drafts only on request: every visit to the enrollment form leaves one
     if status_filter != 'all':
         applications = applications.filter(status=status_filter)
+    else:
+        applications = applications.exclude(status='draft')
     
     if search_query:
         applications = applications.filter(
@@ -182,26 +188,21 @@ def admin_update_application_status(request, application_id):
     
     if new_status not in dict(EnrollmentApplication.STATUS_CHOICES):
         return JsonResponse({'error': 'Invalid status'}, status=400)
+    if application.status == 'draft' and new_status != 'draft':
+        return JsonResponse({'error': 'Draft applications must be submitted by the student first'}, status=400)
     
-    application.status = new_status
-    application.save()
+    with transaction.atomic():
+        application.status = new_status
+        application.save()
+        
+        # If approved, create enrollment records; approving is the staff's call,
+        # so this covers fees paid outside Razorpay too
+        if new_status == 'approved':
+            provision_enrollments([application], paid_only=False)
     
     messages.success(request, f'Application status updated to {application.get_status_display()}')
-    
-    # If approved, create enrollment records
-    if new_status == 'approved':
-        from .views import payment_success
-        # Create enrollments similar to payment success
-        levels = application.levels.all()
-        for level in levels:
-            Enrollment.objects.get_or_create(
-                user=application.user,
-                course_level=level,
-                defaults={
-                    'status': 'active',
-                    'progress_percentage': 0,
-                }
-            )
+    if new_status == 'approved' and application.payment_status != 'success':
+        messages.warning(request, 'This application has no successful payment; the student was enrolled anyway.')
     
     return JsonResponse({'success': True, 'status': new_status})
 
@@ -481,25 +482,43 @@ def admin_analytics(request):
     enrollments_year = Enrollment.objects.filter(enrolled_at__date__gte=year_ago).count()
     
     # Application trends
-    applications_today = EnrollmentApplication.objects.filter(created_at__date=today).count()
-    applications_week = EnrollmentApplication.objects.filter(created_at__date__gte=week_ago).count()
-    applications_month = EnrollmentApplication.objects.filter(created_at__date__gte=month_ago).count()
-    
-    # Revenue trends
-    revenue_today = EnrollmentApplication.objects.filter(
-        payment_status='success',
-        paid_at__date=today
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    revenue_week = EnrollmentApplication.objects.filter(
-        payment_status='success',
-        paid_at__date__gte=week_ago
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    revenue_month = EnrollmentApplication.objects.filter(
+    applications = EnrollmentApplication.objects.exclude(status='draft')
+    applications_today = applications.filter(created_at__date=today).count()
+    applications_week = applications.filter(created_at__date__gte=week_ago).count()
+    applications_month = applications.filter(created_at__date__gte=month_ago).count()
+    
+    # Revenue trends, in one pass over the (payment_status, paid_at) index.
+    # Comparing paid_at itself rather than paid_at__date keeps the index usable.
+    day_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    revenue = EnrollmentApplication.objects.filter(
         payment_status='success',
-        paid_at__date__gte=month_ago
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+        paid_at__gte=day_start - timedelta(days=30)
+    ).aggregate(
+        today=Sum('total_amount', filter=Q(paid_at__gte=day_start)),
+        week=Sum('total_amount', filter=Q(paid_at__gte=day_start - timedelta(days=7))),
+        month=Sum('total_amount'),
+    )
+    revenue_today = revenue['today'] or 0
+    revenue_week = revenue['week'] or 0
+    revenue_month = revenue['month'] or 0
+    
+    # Revenue breakdowns over the past year, grouped in SQL from the prices
+    # recorded on each paid application's line items
+    paid_line_items = ApplicationLineItem.objects.filter(
+        application__payment_status='success',
+        application__paid_at__gte=day_start - timedelta(days=365)
+    )
+    revenue_by_language = paid_line_items.values(
+        'level__language__name',
+        'level__language__flag_emoji'
+    ).annotate(
+        revenue=ApplicationLineItem.TOTAL,
+        seats=Count('id')
+    ).order_by('-revenue')
+    revenue_by_level = paid_line_items.values('level__level').annotate(
+        revenue=ApplicationLineItem.TOTAL,
+        seats=Count('id')
+    ).order_by('level__level')
     
     # Popular languages
     popular_languages = Language.objects.annotate(
@@ -522,6 +541,8 @@ def admin_analytics(request):
         'revenue_today': revenue_today,
         'revenue_week': revenue_week,
         'revenue_month': revenue_month,
+        'revenue_by_language': revenue_by_language,
+        'revenue_by_level': revenue_by_level,
         'popular_languages': popular_languages,
         'enrollments_by_status': enrollments_by_status,
     }
@@ -539,8 +560,10 @@ def admin_users(request):
     # Base queryset with annotations
     users = User.objects.annotate(
         enrollments_count=Count('enrollments', distinct=True),
-        applications_count=Count('enrollment_applications', distinct=True)
-    ).prefetch_related('enrollment_applications').order_by('-date_joined')
+        applications_count=Count(
+            'enrollment_applications', filter=~Q(enrollment_applications__status='draft'), distinct=True
+        )
+    ).order_by('-date_joined')
     
     # Apply search filter
     if search_query:
@@ -580,14 +603,10 @@ def admin_user_detail(request, user_id):
     ).order_by('-enrolled_at')
     
     # Get user's applications
-    applications = EnrollmentApplication.objects.filter(user=user).select_related(
+    applications = EnrollmentApplication.objects.filter(user=user).exclude(status='draft').select_related(
         'language'
     ).prefetch_related('levels').order_by('-created_at')
     
-    # Get user's latest photo from enrollment application
-    latest_application_with_photo = applications.filter(photo__isnull=False).first()
-    user_photo = latest_application_with_photo.photo if latest_application_with_photo else None
-    
     # Get user's certificates
     certificates = Certificate.objects.filter(
         enrollment__user=user
@@ -598,7 +617,6 @@ def admin_user_detail(request, user_id):
         'enrollments': enrollments,
         'applications': applications,
         'certificates': certificates,
-        'user_photo': user_photo,
     }
     
     return render(request, 'admin/user_detail.html', context)
@@ -715,6 +733,7 @@ def admin_add_language(request):
         try:
             name = request.POST.get('name', '').strip()
             flag_emoji = request.POST.get('flag_emoji', '').strip()
+            aliases = request.POST.get('aliases', '').strip()
             description = request.POST.get('description', '').strip()
             category = int(request.POST.get('category', 1))
             image_url = request.POST.get('image_url', '').strip()
@@ -731,15 +750,17 @@ def admin_add_language(request):
             language = Language.objects.create(
                 name=name,
                 flag_emoji=flag_emoji,
+                aliases=aliases,
                 description=description,
                 category=category,
                 image_url=image_url if image_url else ''
             )
             
-            # Handle image file upload
+            # Handle image file upload; resized copies are built in the background
             if image_file:
                 language.image_file = image_file
                 language.save()
+                run_in_background(generate_language_image_variants, language.id)
             
             # Automatically create all course levels based on category
             level_codes = ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']
@@ -781,6 +802,7 @@ def admin_update_language(request, language_id):
             old_category = language.category
             name = request.POST.get('name', '').strip()
             flag_emoji = request.POST.get('flag_emoji', '').strip()
+            aliases = request.POST.get('aliases', '').strip()
             description = request.POST.get('description', '').strip()
             category = int(request.POST.get('category', 1))
             image_url = request.POST.get('image_url', '').strip()
@@ -797,6 +819,7 @@ def admin_update_language(request, language_id):
             
             language.name = name
             language.flag_emoji = flag_emoji
+            language.aliases = aliases
             language.description = description
             language.category = category
             language.image_url = image_url if image_url else ''
@@ -807,6 +830,9 @@ def admin_update_language(request, language_id):
             
             language.save()
             
+            if image_file:
+                run_in_background(generate_language_image_variants, language.id)
+            
             # If category changed, update all course level prices
             if old_category != category:
                 levels_updated = 0
@@ -951,7 +977,10 @@ def admin_delete_level(request, level_id):
 def admin_get_language(request, language_id):
     """Get language data as JSON"""
     from .serializers import LanguageSerializer
-    language = get_object_or_404(Language, id=language_id)
+    language = get_object_or_404(
+        LanguageSerializer.setup_eager_loading(Language.objects.all()),
+        id=language_id
+    )
     serializer = LanguageSerializer(language)
     data = serializer.data
     
@@ -968,7 +997,10 @@ def admin_get_language(request, language_id):
 def admin_get_level(request, level_id):
     """Get course level data as JSON"""
     from .serializers import CourseLevelSerializer
-    level = get_object_or_404(CourseLevel, id=level_id)
+    level = get_object_or_404(
+        CourseLevelSerializer.setup_eager_loading(CourseLevel.objects.all()),
+        id=level_id
+    )
     serializer = CourseLevelSerializer(level)
     return JsonResponse(serializer.data)
 
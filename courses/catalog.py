@@ -0,0 +1,237 @@
+"""
+In-process snapshot of the Language/CourseLevel catalog.
+
+The catalog is small and rarely edited, so every worker loads it once and
+serves catalog reads from memory. A version stamp kept in the shared cache is
+bumped whenever a Language or CourseLevel is saved or deleted (see
+courses/signals.py); each worker compares its snapshot against that stamp and
+reloads on the next request after a change.
+
+Catalog API payloads are identical for every visitor, so they are rendered
+to JSON once per snapshot and kept as raw, gzip and brotli byte blobs.
+"""
+import bisect
+import gzip
+import hashlib
+import threading
+import uuid
+from functools import wraps
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional; without it only gzip blobs are produced
+    brotli = None
+
+from .models import Language, normalize_language_name
+from .serializers import LanguageSerializer
+
+
+CATALOG_VERSION_KEY = 'courses:catalog:version'
+
+_snapshot_lock = threading.Lock()
+_snapshot = None
+
+
+class CatalogSnapshot:
+    """Immutable view of the whole catalog with lookup indexes"""
+    __slots__ = (
+        'version', 'languages', 'languages_by_category', 'languages_by_id',
+        'languages_by_key', 'search_index', 'levels_by_language', 'levels',
+        'last_modified', 'etag', '_json_blobs',
+    )
+
+    def __init__(self, version, languages):
+        languages = tuple(languages)
+        levels_by_language = {}
+        levels = {}
+        for language in languages:
+            language_levels = tuple(language.levels.all())
+            levels_by_language[language.id] = language_levels
+            for level in language_levels:
+                levels[(language.id, level.level)] = level
+
+        self.version = version
+        self.languages = languages
+        self.languages_by_category = tuple(
+            sorted(languages, key=lambda language: (language.category, language.name))
+        )
+        self.languages_by_id = MappingProxyType({language.id: language for language in languages})
+
+        # Normalized names and aliases for exact lookups, plus a sorted
+        # (key, language id) index over every word start for prefix search
+        languages_by_key = {}
+        search_index = set()
+        for language in languages:
+            for key in language.search_keys:
+                languages_by_key.setdefault(key, language)
+                words = key.split('-')
+                for i in range(len(words)):
+                    search_index.add(('-'.join(words[i:]), language.id))
+        self.languages_by_key = MappingProxyType(languages_by_key)
+        self.search_index = tuple(sorted(search_index))
+        self.levels_by_language = MappingProxyType(levels_by_language)
+        self.levels = MappingProxyType(levels)
+
+        # Fingerprint for conditional GETs: level edits touch their language's
+        # updated_at (see Language.refresh_price_summary) and the counts catch deletions.
+        self.last_modified = max((language.updated_at for language in languages), default=None)
+        fingerprint = f"{self.last_modified.isoformat() if self.last_modified else ''}:{len(languages)}:{len(levels)}"
+        self.etag = hashlib.md5(fingerprint.encode()).hexdigest()
+
+        # Rendered API payloads, filled lazily by get_json_blob()
+        self._json_blobs = {}
+
+    def get_language(self, pk):
+        """Return the language with the given id, or None"""
+        try:
+            return self.languages_by_id.get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def find_language(self, name):
+        """Match a language by normalized name or alias, falling back to a prefix match"""
+        key = normalize_language_name(name)
+        if not key:
+            return None
+        language = self.languages_by_key.get(key)
+        if language is None:
+            matches = self.search(key, limit=1)
+            language = matches[0] if matches else None
+        return language
+
+    def search(self, prefix, limit=10):
+        """Return languages whose name, alias or any word of them starts with prefix"""
+        key = normalize_language_name(prefix)
+        if not key:
+            return []
+        results = []
+        seen = set()
+        start = bisect.bisect_left(self.search_index, (key,))
+        for indexed_key, language_id in self.search_index[start:]:
+            if not indexed_key.startswith(key) or len(results) >= limit:
+                break
+            if language_id not in seen:
+                seen.add(language_id)
+                results.append(self.languages_by_id[language_id])
+        return results
+
+    def get_levels(self, language):
+        """Return the course levels of a language, in level order"""
+        return self.levels_by_language.get(language.id, ())
+
+    def get_level(self, language, level_code):
+        """Return a single course level of a language, or None"""
+        return self.levels.get((language.id, level_code))
+
+    def get_json_blob(self, key, build_data):
+        """Return the pre-rendered JSON blob for key, building it on first use"""
+        blob = self._json_blobs.get(key)
+        if blob is None:
+            blob = self._json_blobs.setdefault(key, JSONBlob(JSONRenderer().render(build_data(self))))
+        return blob
+
+
+class JSONBlob:
+    """A rendered JSON payload with its compressed variants"""
+    __slots__ = ('identity', 'gzip', 'br')
+
+    def __init__(self, content):
+        self.identity = content
+        self.gzip = gzip.compress(content, compresslevel=9, mtime=0)
+        self.br = brotli.compress(content) if brotli is not None else None
+
+    def encoded(self, accept_encoding):
+        """Return (body, content_encoding) for an Accept-Encoding header value"""
+        accepted = set()
+        for part in accept_encoding.split(','):
+            coding, _, params = part.strip().partition(';')
+            if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(coding.strip().lower())
+        if self.br is not None and 'br' in accepted:
+            return self.br, 'br'
+        if 'gzip' in accepted:
+            return self.gzip, 'gzip'
+        return self.identity, None
+
+
+def get_catalog_version():
+    """Return the shared catalog version stamp, creating one if none is set"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every worker's snapshot"""
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def load_catalog(version):
+    """Load the catalog from the database (two queries)"""
+    return CatalogSnapshot(version, LanguageSerializer.setup_eager_loading(Language.objects.all()))
+
+
+def clear_local_catalog():
+    """Drop this worker's snapshot so the next read reloads it"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+
+def get_catalog():
+    """Return this worker's catalog snapshot, reloading it if the version moved"""
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = load_catalog(version)
+        return _snapshot
+
+
+def _catalog_etag(request, *args, **kwargs):
+    # Weak: the identity, gzip and br bodies share it, which a strong ETag must not
+    return f'W/"{get_catalog().etag}"'
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return get_catalog().last_modified
+
+
+def catalog_conditional(view_func):
+    """Emit ETag/Last-Modified for a catalog view and answer 304 when unchanged"""
+    conditional_view = condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        # Also on the 304s condition() answers before the view runs
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+    return wrapper
+
+
+def catalog_json_response(request, key, build_data):
+    """Serve a catalog payload from its pre-rendered blob, skipping serialization"""
+    blob = get_catalog().get_json_blob(key, build_data)
+    body, content_encoding = blob.encoded(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = HttpResponse(body, content_type='application/json')
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,23 @@
+"""
+System checks for the payment configuration.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+
+@register()
+def check_razorpay_webhook_secret(app_configs, **kwargs):
+    """Razorpay keys without a webhook secret: every webhook would be refused.
+
+    An error in production, so `manage.py migrate` in build.sh fails the
+    deploy instead of Razorpay retrying (and eventually disabling) the
+    webhook; a warning while developing.
+    """
+    if not settings.RAZORPAY_KEY_ID or settings.RAZORPAY_WEBHOOK_SECRET:
+        return []
+    level = Warning if settings.DEBUG else Error
+    return [level(
+        'RAZORPAY_KEY_ID is set but RAZORPAY_WEBHOOK_SECRET is not; payment webhooks will be rejected.',
+        hint='Set RAZORPAY_WEBHOOK_SECRET to the secret of the webhook in the Razorpay dashboard (see RAZORPAY_SETUP.md).',
+        id='courses.E001' if level is Error else 'courses.W001',
+    )]
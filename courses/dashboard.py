@@ -0,0 +1,135 @@
+"""
+View-model for the student dashboard.
+
+Everything the dashboard shows is derived from two fetches: the user's
+enrollments (with their language, schedule, certificate and invoices) and
+their recent applications (with language and levels). Counts, certificates,
+invoices and the schedule section are all computed from
+those rows, so the page costs a fixed number of queries and the template
+only does linear loops.
+"""
+from collections import defaultdict
+
+from .models import Enrollment, EnrollmentApplication
+
+
+# The dashboard lists the most recent applications only
+DASHBOARD_APPLICATION_LIMIT = 50
+
+# Fetches used by build_dashboard; kept here so other views can reuse them
+ENROLLMENT_SELECT_RELATED = ('course_level__language', 'class_schedule', 'certificate')
+ENROLLMENT_PREFETCH_RELATED = ('invoices',)
+APPLICATION_SELECT_RELATED = ('language',)
+APPLICATION_PREFETCH_RELATED = ('levels',)
+
+# Keys of the context built by build_dashboard, besides 'user'
+DASHBOARD_CONTEXT_NAMES = (
+    'enrollments', 'active_enrollments', 'completed_enrollments',
+    'scheduled_enrollments', 'schedule_preferences', 'certificates', 'invoices',
+    'enrollment_applications', 'applications_by_language',
+    'enrollments_count', 'active_enrollments_count', 'completed_enrollments_count',
+    'certificates_count', 'invoices_count',
+)
+
+
+def get_certificate(enrollment):
+    """The enrollment's certificate, or None (reverse one-to-one raises otherwise)"""
+    return getattr(enrollment, 'certificate', None)
+
+
+def is_downloadable_certificate(certificate):
+    return (
+        certificate is not None
+        and certificate.status == 'approved'
+        and certificate.certificate_file.name is not None
+    )
+
+
+def fetch_enrollments(user):
+    return list(
+        Enrollment.objects.filter(user=user)
+        .select_related(*ENROLLMENT_SELECT_RELATED)
+        .prefetch_related(*ENROLLMENT_PREFETCH_RELATED)
+    )
+
+
+def fetch_applications(user, limit=DASHBOARD_APPLICATION_LIMIT):
+    return list(
+        EnrollmentApplication.objects.filter(user=user).exclude(status='draft')
+        .select_related(*APPLICATION_SELECT_RELATED)
+        .prefetch_related(*APPLICATION_PREFETCH_RELATED)
+        .order_by('-created_at')[:limit]
+    )
+
+
+def group_applications_by_language(applications):
+    """Map language_id -> applications for that language, newest first"""
+    by_language = defaultdict(list)
+    for application in applications:
+        by_language[application.language_id].append(application)
+    return by_language
+
+
+def schedule_preferences(enrollments, applications, applications_by_language):
+    """Applications whose schedule preference is still waiting for assignment.
+
+    For enrollments without an assigned class these are the applications for
+    the same language; with no enrollments at all, every application counts.
+    """
+    if not enrollments:
+        return [application for application in applications if application.schedule_type]
+    preferences = []
+    for enrollment in enrollments:
+        if enrollment.class_schedule_id:
+            continue
+        for application in applications_by_language.get(enrollment.course_level.language_id, ()):
+            if application.schedule_type:
+                preferences.append(application)
+    return preferences
+
+
+def build_dashboard(user):
+    """Build the dashboard template context for a user"""
+    enrollments = fetch_enrollments(user)
+    applications = fetch_applications(user)
+    applications_by_language = group_applications_by_language(applications)
+
+    active_enrollments = []
+    completed_enrollments = []
+    scheduled_enrollments = []
+    certificates = []
+    invoices = []
+    for enrollment in enrollments:
+        if enrollment.status == 'active':
+            active_enrollments.append(enrollment)
+        elif enrollment.status == 'completed':
+            completed_enrollments.append(enrollment)
+        if enrollment.class_schedule_id:
+            scheduled_enrollments.append(enrollment)
+        certificate = get_certificate(enrollment)
+        if is_downloadable_certificate(certificate):
+            certificates.append(certificate)
+        invoices.extend(enrollment.invoices.all())
+
+    # Same order as the Certificate/Invoice Meta.ordering, newest first on ties
+    certificates.sort(key=lambda certificate: (certificate.issued_date, certificate.id), reverse=True)
+    invoices.sort(key=lambda invoice: (invoice.issued_date, invoice.id), reverse=True)
+
+    return {
+        'user': user,
+        'enrollments': enrollments,
+        'active_enrollments': active_enrollments,
+        'completed_enrollments': completed_enrollments,
+        'scheduled_enrollments': scheduled_enrollments,
+        'schedule_preferences': schedule_preferences(enrollments, applications, applications_by_language),
+        'certificates': certificates,
+        'invoices': invoices,
+        'enrollment_applications': applications,
+        'applications_by_language': applications_by_language,
+        # Pre-calculated counts
+        'enrollments_count': len(enrollments),
+        'active_enrollments_count': len(active_enrollments),
+        'completed_enrollments_count': len(completed_enrollments),
+        'certificates_count': len(certificates),
+        'invoices_count': len(invoices),
+    }
@@ -0,0 +1,119 @@
+"""
+Per-user fragment cache for the student dashboard.
+
+Each dashboard section is cached with the {% cache %} tag under a key built
+from version stamps for the data it shows. A user has one stamp per kind of
+row (enrollments, certificates, invoices, applications); signals bump the
+stamp for the affected user when a row is saved or deleted (see
+courses/signals.py), so only the sections that show that data re-render.
+Sections that show language names also vary on the catalog version.
+
+The view-model is built lazily: when every section is a cache hit, the
+dashboard runs no queries for the view-model at all.
+"""
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .catalog import get_catalog_version
+from .dashboard import DASHBOARD_CONTEXT_NAMES, build_dashboard
+
+
+def _fragment_timeout():
+    # Fragments embed storage URLs; signed S3 URLs must not outlive their signature
+    signed_s3_urls = (
+        getattr(settings, 'AWS_STORAGE_BUCKET_NAME', '')
+        and not getattr(settings, 'AWS_S3_CUSTOM_DOMAIN', '')
+        and getattr(settings, 'AWS_QUERYSTRING_AUTH', True)
+    )
+    if signed_s3_urls:
+        return getattr(settings, 'AWS_QUERYSTRING_EXPIRE', 3600) // 2
+    return 60 * 60 * 24
+
+
+DASHBOARD_CACHE_TIMEOUT = _fragment_timeout()
+
+ENROLLMENTS = 'enrollments'
+CERTIFICATES = 'certificates'
+INVOICES = 'invoices'
+APPLICATIONS = 'applications'
+CATALOG = 'catalog'
+
+# Section name -> kinds of data it displays
+DASHBOARD_SECTIONS = {
+    'stats': (ENROLLMENTS, CERTIFICATES, INVOICES),
+    'enrollments': (ENROLLMENTS, CATALOG),
+    'schedule': (ENROLLMENTS, APPLICATIONS, CATALOG),
+    'certificates': (ENROLLMENTS, CERTIFICATES, CATALOG),
+    'invoices': (INVOICES,),
+    'applications': (APPLICATIONS, CATALOG),
+}
+
+
+def _version_key(user_id, kind):
+    return f'courses:dashboard:{user_id}:{kind}'
+
+
+def get_dashboard_versions(user_id):
+    """Return {kind: version stamp} for a user, creating missing stamps"""
+    kinds = (ENROLLMENTS, CERTIFICATES, INVOICES, APPLICATIONS)
+    keys = {_version_key(user_id, kind): kind for kind in kinds}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, kind in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions[kind] = version
+    versions[CATALOG] = get_catalog_version()
+    return versions
+
+
+def get_section_keys(user_id):
+    """Return {section: fragment cache vary key} for a user's dashboard"""
+    versions = get_dashboard_versions(user_id)
+    return {
+        section: ':'.join([str(user_id)] + [versions[kind] for kind in kinds])
+        for section, kinds in DASHBOARD_SECTIONS.items()
+    }
+
+
+def bump_dashboard_versions(user_ids, *kinds):
+    """Invalidate the given kinds of dashboard data for users right away"""
+    cache.set_many(
+        {_version_key(user_id, kind): uuid.uuid4().hex for user_id in set(user_ids) for kind in kinds},
+        timeout=None,
+    )
+
+
+def invalidate_dashboard(user_ids, *kinds):
+    """Invalidate dashboard sections for users once the transaction commits.
+
+    Signals cover model saves and deletes; call this directly after
+    queryset.update() or bulk_create(), which don't send them.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        transaction.on_commit(lambda: bump_dashboard_versions(user_ids, *kinds))
+
+
+def lazy_dashboard_context(user):
+    """Dashboard context whose view-model is only built if a section renders"""
+    built = {}
+
+    def get(name):
+        if not built:
+            built.update(build_dashboard(user))
+        return built[name]
+
+    # The template engine calls callables it finds in the context
+    context = {name: partial(get, name) for name in DASHBOARD_CONTEXT_NAMES}
+    context['user'] = user
+    context['dashboard_keys'] = get_section_keys(user.pk)
+    context['dashboard_cache_timeout'] = DASHBOARD_CACHE_TIMEOUT
+    return context
@@ -0,0 +1,39 @@
+"""
+Draft enrollment applications.
+
+The enrollment form autosaves into one draft application per user (status
+'draft'), a few fields or a single file at a time, through the
+enrollment-draft endpoint. Submitting the form then completes the draft
+instead of creating a new application, so files that were already saved
+are not uploaded again after a validation error or a reload.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import EnrollmentApplication
+
+
+def get_draft(user):
+    """The user's draft application, or None"""
+    return (
+        EnrollmentApplication.objects.filter(user=user, status='draft')
+        .order_by('-updated_at').first()
+    )
+
+
+def get_or_create_draft(user):
+    """The user's draft application, created on the first autosave"""
+    with transaction.atomic():
+        # Serialize concurrent first autosaves so they share one draft
+        get_user_model().objects.select_for_update().filter(pk=user.pk).first()
+        draft = get_draft(user)
+        if draft is None:
+            draft = EnrollmentApplication.objects.create(
+                user=user,
+                status='draft',
+                full_name=user.get_full_name(),
+                email=user.email,
+                phone_number=(getattr(user, 'phone_number', '') or '')[:17],
+                date_of_birth=getattr(user, 'date_of_birth', None),
+            )
+    return draft
@@ -0,0 +1,178 @@
+"""
+A local stand-in for the Razorpay orders API.
+
+Serves just what this project calls (create, fetch and list orders, list
+payments and an order's payments) with configurable latency,
+per-connection handshake delay and error rate, so the client in
+courses/payments.py can be exercised and timed without network access.
+POST /stub/orders/<id>/capture records a captured payment for an order,
+as if the student had paid (?status=failed records a failed attempt).
+
+Run it with `manage.py razorpay_stub`; benchmark_payment_gateway starts one
+in-process.
+"""
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def _page(entities, params):
+    """A collection page like Razorpay's: newest first, filtered on created_at, count/skip"""
+    since = int(params.get('from', ['0'])[0])
+    until = int(params.get('to', [str(2 ** 31)])[0])
+    count = min(int(params.get('count', ['10'])[0]), 100)
+    skip = int(params.get('skip', ['0'])[0])
+    matching = sorted(
+        (entity for entity in entities if since <= entity['created_at'] <= until),
+        key=lambda entity: entity['created_at'], reverse=True,
+    )
+    items = matching[skip:skip + count]
+    return {'entity': 'collection', 'count': len(items), 'items': items}
+
+
+class StubGateway(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, handshake=0.0, error_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.handshake = handshake
+        self.error_rate = error_rate
+        self.orders = {}
+        self.payments = {}
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that's expected here
+        pass
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API, so pooled clients can reuse connections
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        # Stands in for the TCP + TLS handshake of a new connection
+        time.sleep(self.server.handshake)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_found(self):
+        self._reply(404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The requested URL was not found on the server.'}})
+
+    def _handle(self, method):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        with server.lock:
+            server.requests += 1
+        time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+        if not self.headers.get('Authorization'):
+            return self._reply(401, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'Authentication failed'}})
+        if random.random() < server.error_rate:
+            return self._reply(500, {'error': {'code': 'SERVER_ERROR', 'description': 'Stub gateway error'}})
+
+        path, _, query = self.path.partition('?')
+        parts = [part for part in path.split('/') if part]
+        if method == 'GET' and parts in (['v1', 'orders'], ['v1', 'payments']):
+            with server.lock:
+                if parts[1] == 'orders':
+                    entities = list(server.orders.values())
+                else:
+                    entities = [payment for payments in server.payments.values() for payment in payments]
+            return self._reply(200, _page(entities, parse_qs(query)))
+        if method == 'POST' and parts == ['v1', 'orders']:
+            data = json.loads(body or b'{}')
+            if not isinstance(data.get('amount'), int) or data['amount'] < 100:
+                return self._reply(400, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The amount must be atleast INR 1.00'}})
+            order = {
+                'id': f'order_{secrets.token_hex(7)}',
+                'entity': 'order',
+                'amount': data['amount'],
+                'amount_paid': 0,
+                'amount_due': data['amount'],
+                'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'),
+                'status': 'created',
+                'attempts': 0,
+                'notes': data.get('notes', {}),
+                'created_at': int(time.time()),
+            }
+            with server.lock:
+                server.orders[order['id']] = order
+                server.payments[order['id']] = []
+            return self._reply(200, order)
+        if method == 'GET' and len(parts) in (3, 4) and parts[:2] == ['v1', 'orders']:
+            order = server.orders.get(parts[2])
+            if order is None:
+                return self._not_found()
+            if len(parts) == 3:
+                return self._reply(200, order)
+            if parts[3] == 'payments':
+                items = server.payments[order['id']]
+                return self._reply(200, {'entity': 'collection', 'count': len(items), 'items': items})
+        if method == 'POST' and len(parts) == 4 and parts[:2] == ['stub', 'orders'] and parts[3] == 'capture':
+            order = server.orders.get(parts[2])
+            if order is None:
+                return self._not_found()
+            # ?status=failed records a failed attempt instead
+            status = parse_qs(query).get('status', ['captured'])[0]
+            payment = {
+                'id': f'pay_{secrets.token_hex(7)}',
+                'entity': 'payment',
+                'amount': order['amount'],
+                'currency': order['currency'],
+                'status': status,
+                'order_id': order['id'],
+                'captured': status == 'captured',
+                'created_at': int(time.time()),
+            }
+            with server.lock:
+                server.payments[order['id']].append(payment)
+                order['attempts'] += 1
+                if status == 'captured':
+                    order.update(status='paid', amount_paid=order['amount'], amount_due=0)
+                else:
+                    order['status'] = 'attempted'
+            return self._reply(200, payment)
+        return self._not_found()
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+def start_stub(port=0, **options):
+    """Start a StubGateway on 127.0.0.1 in a daemon thread; port 0 picks a free one"""
+    server = StubGateway(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
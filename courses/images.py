@@ -0,0 +1,154 @@
+"""
+Pillow helpers for resized image derivatives.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# Widths offered in srcset for the language cards
+LANGUAGE_IMAGE_WIDTHS = (320, 640, 960, 1280)
+
+# Longest side kept for uploaded application images, and for their thumbnails
+NORMALIZED_IMAGE_SIDES = {'photo': 1600, 'signature': 1200}
+DOCUMENT_THUMBNAIL_SIDE = 240
+
+DERIVATIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def open_image(field_file):
+    """Open an uploaded image, applying its EXIF orientation"""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    return ImageOps.exif_transpose(image)
+
+
+def flatten(image):
+    """Convert to RGB, putting transparent areas on white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, image_format):
+    """Encode an image with the settings for one of DERIVATIVE_FORMATS"""
+    options = dict(DERIVATIVE_FORMATS[image_format])
+    buffer = BytesIO()
+    image.save(buffer, options.pop('format'), **options)
+    return buffer.getvalue()
+
+
+def resize_to_width(image, width):
+    """Return a copy scaled down to width (never up), keeping the aspect ratio"""
+    if image.width <= width:
+        return image.copy()
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def fit_within(image, side):
+    """Return a copy scaled down (never up) so neither side exceeds side"""
+    image = image.copy()
+    image.thumbnail((side, side), Image.LANCZOS)
+    return image
+
+
+def normalize_upload(field_file, max_side):
+    """Re-encode an uploaded image as an upright JPEG without metadata.
+
+    The image is scaled down to max_side and a DOCUMENT_THUMBNAIL_SIDE
+    thumbnail is saved next to it. Returns (name, thumbnail name).
+    Raises OSError if the file isn't a readable image.
+    """
+    # Re-encoding from pixels drops EXIF (GPS, camera data) along with the rotation tag
+    image = fit_within(flatten(open_image(field_file)), max_side)
+    directory, basename = os.path.split(field_file.name)
+    stem = os.path.splitext(basename)[0]
+    # Through the field's storage, so identical results share one stored blob
+    name = field_file.storage.save(f'{directory}/{stem}.jpg', ContentFile(encode(image, 'jpeg')))
+    thumbnail = default_storage.save(
+        f'{directory}/thumbnails/{stem}-{DOCUMENT_THUMBNAIL_SIDE}.jpg',
+        ContentFile(encode(fit_within(image, DOCUMENT_THUMBNAIL_SIDE), 'jpeg')),
+    )
+    return name, thumbnail
+
+
+def build_derivatives(field_file, directory, widths=LANGUAGE_IMAGE_WIDTHS):
+    """Save resized WebP and JPEG copies of an image field file.
+
+    Returns {"webp": {"320": name, ...}, "jpeg": {...}} with storage names.
+    Widths larger than the original are collapsed into one full-size copy.
+    """
+    image = flatten(open_image(field_file))
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    digest = hashlib.sha1(field_file.name.encode()).hexdigest()[:8]
+
+    targets = sorted({min(width, image.width) for width in widths})
+    variants = {image_format: {} for image_format in DERIVATIVE_FORMATS}
+    for width in targets:
+        resized = resize_to_width(image, width)
+        for image_format in DERIVATIVE_FORMATS:
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            name = f'{directory}/{stem}-{digest}-{width}w.{extension}'
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            saved_name = default_storage.save(name, ContentFile(encode(resized, image_format)))
+            variants[image_format][str(width)] = saved_name
+    return variants
+
+
+def build_square_thumbnails(field_file, directory, sizes, image_format='jpeg'):
+    """Save center-cropped square thumbnails of an image field file.
+
+    Returns {"96": name, ...} with storage names. Sizes larger than the
+    image's short side are collapsed into one thumbnail at that size.
+    """
+    image = flatten(open_image(field_file))
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    digest = hashlib.sha1(field_file.name.encode()).hexdigest()[:8]
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+
+    thumbnails = {}
+    short_side = min(image.size)
+    for size in sizes:
+        side = min(size, short_side)
+        name = f'{directory}/{stem}-{digest}-{side}sq.{extension}'
+        if name not in thumbnails.values():
+            thumbnail = ImageOps.fit(image, (side, side), Image.LANCZOS)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            name = default_storage.save(name, ContentFile(encode(thumbnail, image_format)))
+        thumbnails[str(size)] = name
+    return thumbnails
+
+
+def delete_derivatives(variants, keep=None):
+    """Delete derivative files, except names that are also in keep"""
+    keep_names = {name for sizes in (keep or {}).values() for name in sizes.values()}
+    for sizes in (variants or {}).values():
+        for name in sizes.values():
+            if name not in keep_names:
+                default_storage.delete(name)
+
+
+def srcset(variants, image_format):
+    """Build a srcset attribute value from stored derivative names"""
+    sizes = (variants or {}).get(image_format, {})
+    return ', '.join(
+        f'{default_storage.url(name)} {width}w'
+        for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+    )
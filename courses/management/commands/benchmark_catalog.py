@@ -0,0 +1,76 @@
+"""
+Compare catalog list throughput: pre-rendered blob vs. serializer + JSONRenderer.
+
+Usage:
+    python manage.py benchmark_catalog
+    python manage.py benchmark_catalog --requests 2000 --encoding gzip
+
+Both paths are called in-process through RequestFactory with a warm catalog
+snapshot, so the numbers measure view work only (no network, no middleware).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from courses.catalog import get_catalog
+from courses.serializers import LanguageSerializer
+from courses.views import language_list
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def serializer_language_list(request):
+    """The language_list path before pre-rendering: serialize and render per request"""
+    serializer = LanguageSerializer(get_catalog().languages, many=True)
+    return Response(serializer.data)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the pre-rendered catalog blob against the serializer path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path')
+        parser.add_argument(
+            '--encoding',
+            default='br, gzip',
+            help='Accept-Encoding sent with each request (use "" for identity)',
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        total = options['requests']
+        headers = {'HTTP_ACCEPT_ENCODING': options['encoding']}
+        get_catalog()  # load the snapshot outside the timed loops
+
+        paths = [
+            ('serializer + JSONRenderer', serializer_language_list),
+            ('pre-rendered blob', language_list),
+        ]
+        results = {}
+        for name, view in paths:
+            # One untimed call renders the blob for this catalog version
+            response = view(factory.get('/api/courses/', **headers))
+            if hasattr(response, 'render'):
+                response.render()
+            size = len(response.content)
+
+            started = time.perf_counter()
+            for _ in range(total):
+                response = view(factory.get('/api/courses/', **headers))
+                if hasattr(response, 'render'):
+                    response.render()
+            elapsed = time.perf_counter() - started
+
+            results[name] = total / elapsed
+            encoding = response.get('Content-Encoding', 'identity')
+            self.stdout.write(
+                f'{name:>26}: {results[name]:9.1f} req/s  '
+                f'({elapsed / total * 1000:.3f} ms/req, {size} bytes, {encoding})'
+            )
+
+        speedup = results['pre-rendered blob'] / results['serializer + JSONRenderer']
+        self.stdout.write(self.style.SUCCESS(f'Pre-rendered blob is {speedup:.1f}x the serializer path'))
@@ -0,0 +1,80 @@
+"""
+Compare order creation latency: a new razorpay.Client per call vs. the pooled client.
+
+Usage:
+    python manage.py benchmark_payment_gateway
+    python manage.py benchmark_payment_gateway --requests 200 --handshake-ms 80 --error-rate 0.2
+
+Orders are created against a stub gateway started in-process (see
+courses/gateway_stub.py), so no network access or real keys are needed.
+With --error-rate the pooled client's retries and circuit breaker come into
+play; failed calls are counted rather than timed.
+"""
+import statistics
+import time
+
+import razorpay
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from courses import payments
+from courses.gateway_stub import start_stub
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Razorpay order creation with and without the pooled client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Orders created per client')
+        parser.add_argument('--latency-ms', type=float, default=40, help='Stub delay before each response')
+        parser.add_argument('--handshake-ms', type=float, default=60, help='Stub delay per new connection')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of stub responses that are 500s')
+
+    def handle(self, *args, **options):
+        server = start_stub(
+            latency=options['latency_ms'] / 1000,
+            handshake=options['handshake_ms'] / 1000,
+            error_rate=options['error_rate'],
+        )
+        order = {'amount': 1600000, 'currency': 'INR', 'receipt': 'IFLA_benchmark'}
+        auth = ('rzp_test_benchmark', 'benchmark_secret')
+
+        def fresh_client():
+            client = razorpay.Client(auth=auth, base_url=server.base_url)
+            return client.order.create(data=order)
+
+        def pooled_client():
+            return payments.create_order(order)
+
+        try:
+            with override_settings(RAZORPAY_KEY_ID=auth[0], RAZORPAY_KEY_SECRET=auth[1], RAZORPAY_BASE_URL=server.base_url):
+                results = {}
+                for name, create in [('new client per call', fresh_client), ('pooled client', pooled_client)]:
+                    connections = server.connections
+                    timings, failures = [], 0
+                    for _ in range(options['requests']):
+                        started = time.perf_counter()
+                        try:
+                            create()
+                        except Exception:
+                            failures += 1
+                            continue
+                        timings.append((time.perf_counter() - started) * 1000)
+                    results[name] = timings
+                    if timings:
+                        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                        summary = f'p50 {statistics.median(timings):7.1f} ms  p95 {p95:7.1f} ms'
+                    else:
+                        summary = 'no successful calls'
+                    self.stdout.write(
+                        f'{name:>20}: {summary}  '
+                        f'{failures} failed, {server.connections - connections} connection(s) opened'
+                    )
+                self.stdout.write(f'Circuit breaker: {payments.get_breaker().state}')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        if results['new client per call'] and results['pooled client']:
+            speedup = statistics.median(results['new client per call']) / statistics.median(results['pooled client'])
+            self.stdout.write(self.style.SUCCESS(f'Pooled client median is {speedup:.1f}x faster'))
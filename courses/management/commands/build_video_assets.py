@@ -0,0 +1,105 @@
+"""
+Build poster frames and lighter renditions for the static videos.
+
+Usage:
+    python manage.py build_video_assets
+    python manage.py build_video_assets --force --height 540
+
+For every .mp4 under static/media this writes, next to the source:
+    <name>.poster.jpg  - a frame from early in the clip, shown before playback
+    <name>.lite.mp4    - a smaller H.264 rendition with no audio and faststart
+
+Run it before collectstatic (build.sh does). It needs ffmpeg, either on PATH
+or from the imageio-ffmpeg package; without one it prints a warning and the
+templates keep using the original video only.
+"""
+import shutil
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.templatetags.media_tags import LITE_SUFFIX, POSTER_SUFFIX
+
+try:
+    import imageio_ffmpeg
+except ImportError:  # optional; a system ffmpeg works too
+    imageio_ffmpeg = None
+
+
+def find_ffmpeg():
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None and imageio_ffmpeg is not None:
+        try:
+            ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        except RuntimeError:
+            ffmpeg = None
+    return ffmpeg
+
+
+class Command(BaseCommand):
+    help = 'Extract poster frames and encode low-bitrate renditions of static videos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild assets that are up to date')
+        parser.add_argument('--height', type=int, default=720, help='Maximum height of the lite rendition')
+        parser.add_argument('--crf', type=int, default=30, help='x264 quality for the lite rendition (higher is smaller)')
+        parser.add_argument('--poster-at', default='1', help='Timestamp (seconds) of the poster frame')
+
+    def handle(self, *args, **options):
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None:
+            self.stdout.write(self.style.WARNING('ffmpeg not found; skipping video assets.'))
+            return
+
+        media_dir = Path(settings.STATICFILES_DIRS[0]) / 'media'
+        videos = [
+            path for path in sorted(media_dir.glob('*.mp4'))
+            if not path.name.endswith(LITE_SUFFIX)
+        ]
+        if not videos:
+            self.stdout.write('No videos found.')
+            return
+
+        for video in videos:
+            stem = video.with_suffix('')
+            poster = Path(f'{stem}{POSTER_SUFFIX}')
+            lite = Path(f'{stem}{LITE_SUFFIX}')
+
+            if self._needs_build(video, poster, options['force']):
+                self._run(ffmpeg, [
+                    '-ss', options['poster_at'], '-i', str(video),
+                    '-frames:v', '1', '-q:v', '3', str(poster),
+                ], poster)
+            if self._needs_build(video, lite, options['force']):
+                self._run(ffmpeg, [
+                    '-i', str(video), '-an',
+                    '-vf', f"scale=-2:'min({options['height']},ih)'",
+                    '-c:v', 'libx264', '-preset', 'slow', '-crf', str(options['crf']),
+                    '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+                    str(lite),
+                ], lite)
+
+            if lite.exists():
+                self.stdout.write(
+                    f'{video.name}: {video.stat().st_size // 1024} KB -> '
+                    f'{lite.name}: {lite.stat().st_size // 1024} KB'
+                )
+
+    @staticmethod
+    def _needs_build(source, target, force):
+        return force or not target.exists() or target.stat().st_mtime < source.stat().st_mtime
+
+    def _run(self, ffmpeg, args, target):
+        result = subprocess.run(
+            [ffmpeg, '-y', '-loglevel', 'error', *args],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            # A failed encode must not break the deploy; the template falls back
+            target.unlink(missing_ok=True)
+            self.stdout.write(self.style.ERROR(f'{target.name}: ffmpeg failed: {result.stderr.strip()}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Built {target.name}'))
@@ -0,0 +1,105 @@
+"""
+Check that the catalog endpoints stay within a fixed query budget.
+
+Usage:
+    python manage.py check_query_budget
+    python manage.py check_query_budget --extra-languages 50
+
+Each endpoint is called with a cold catalog snapshot, so the count includes
+loading the catalog. With --extra-languages, synthetic languages (with all
+six levels) are added inside a transaction that is rolled back afterwards,
+to show that the count does not grow with the catalog. Lookups in a
+database cache table are cache traffic, not catalog queries, and aren't
+counted.
+"""
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from courses import views
+from courses.catalog import clear_local_catalog
+from courses.models import Language, CourseLevel
+
+
+# Loading the catalog snapshot is one query for languages and one for levels
+CATALOG_QUERY_BUDGET = 2
+
+
+def _catalog_queries(queries):
+    """Captured queries other than DatabaseCache reads and writes"""
+    cache = settings.CACHES['default']
+    if cache['BACKEND'] != 'django.core.cache.backends.db.DatabaseCache':
+        return list(queries)
+    table = connection.ops.quote_name(cache['LOCATION'])
+    return [query for query in queries if table not in query['sql']]
+
+
+class Command(BaseCommand):
+    help = 'Fail if any catalog endpoint issues more queries than its fixed budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--extra-languages',
+            type=int,
+            default=0,
+            help='Add this many synthetic languages (rolled back afterwards) before measuring',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._add_synthetic_languages(options['extra_languages'])
+            failures = self._measure_all()
+            transaction.set_rollback(True)
+        # The snapshot may hold the synthetic rows
+        clear_local_catalog()
+
+        if failures:
+            raise CommandError(f'{len(failures)} endpoint(s) over budget: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All catalog endpoints are within the query budget.'))
+
+    def _add_synthetic_languages(self, count):
+        for i in range(count):
+            language = Language.objects.create(
+                name=f'Budget Check Language {i}',
+                description='Synthetic language for query budget checks',
+            )
+            CourseLevel.objects.bulk_create([
+                CourseLevel(language=language, level=code, price=10000 + 1000 * n)
+                for n, (code, _) in enumerate(CourseLevel.LEVEL_CHOICES)
+            ])
+
+    def _measure_all(self):
+        factory = RequestFactory()
+        language = Language.objects.order_by('id').first()
+        language_id = language.id if language else 0
+
+        checks = [
+            ('language_list', lambda: views.language_list(factory.get('/api/courses/'))),
+            ('language_detail', lambda: views.language_detail(
+                factory.get(f'/api/courses/{language_id}/'), pk=language_id)),
+            ('course_levels_by_language', lambda: views.course_levels_by_language(
+                factory.get(f'/api/courses/{language_id}/levels/'), language_id=language_id)),
+            # Rendered directly so the synthetic rows never reach the shared page cache
+            ('languages_page', lambda: render_to_string(
+                'languages.html', {**views.languages_page_context(), 'user': AnonymousUser(), 'csrf_token': 'budget-check'})),
+        ]
+
+        failures = []
+        for name, call in checks:
+            clear_local_catalog()
+            with CaptureQueriesContext(connection) as queries:
+                response = call()
+                # DRF responses render lazily; make sure serialization is counted
+                if hasattr(response, 'render'):
+                    response.render()
+            used = len(_catalog_queries(queries))
+            if used > CATALOG_QUERY_BUDGET:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: {used} queries (budget {CATALOG_QUERY_BUDGET})'))
+            else:
+                self.stdout.write(f'{name}: {used} queries (budget {CATALOG_QUERY_BUDGET})')
+        return failures
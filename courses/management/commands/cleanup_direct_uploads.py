@@ -0,0 +1,50 @@
+"""
+Remove direct uploads that never made it into an enrollment application.
+
+Usage:
+    python manage.py cleanup_direct_uploads
+    python manage.py cleanup_direct_uploads --hours 6 --dry-run
+
+Aborts stale S3 multipart uploads (S3 keeps and bills their parts until
+then), deletes leftover .part files and finished files that no form ever
+submitted, and drops the upload sessions. Scheduled nightly as the
+ifla-cleanup-direct-uploads cron job in render.yaml.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import DirectUpload
+from courses.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned direct uploads and their stored bytes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Age after which an unused upload is abandoned')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = DirectUpload.objects.filter(consumed_at__isnull=True, created_at__lt=cutoff)
+
+        removed = 0
+        for upload in stale.iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Would remove {upload.key} ({upload.backend})')
+                removed += 1
+                continue
+            try:
+                discard_upload(upload)
+                removed += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{upload.key}: {e}'))
+
+        # Consumed sessions only matter until the form is submitted
+        if not options['dry_run']:
+            DirectUpload.objects.filter(consumed_at__lt=cutoff).delete()
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} abandoned upload(s).'))
@@ -0,0 +1,57 @@
+"""
+Move existing application documents into content-addressed storage.
+
+Usage:
+    python manage.py deduplicate_documents
+    python manage.py deduplicate_documents --dry-run
+
+Files uploaded before DeduplicatedStorage (see courses/storage.py) are
+hashed: the first copy of each content becomes the stored blob and the
+other copies are deleted, with every application and avatar pointing at
+the blob instead. Photos and signatures still waiting to be normalized are
+skipped; normalization stores them deduplicated.
+"""
+from django.core.management.base import BaseCommand
+
+from courses.models import EnrollmentApplication, StoredBlob
+from courses.storage import adopt_file
+
+
+class Command(BaseCommand):
+    help = 'Hash existing application documents and store duplicate contents once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list the files that would be hashed')
+
+    def handle(self, *args, **options):
+        fields = EnrollmentApplication.DOCUMENT_FIELDS
+        applications = EnrollmentApplication.objects.only('id', 'image_thumbnails', *fields)
+        names = set()
+        for application in applications.iterator():
+            pending = application.images_pending_normalization()
+            names.update(
+                getattr(application, field_name).name for field_name in fields
+                if getattr(application, field_name) and field_name not in pending
+            )
+        names -= set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+
+        adopted = merged = 0
+        for name in sorted(names):
+            if options['dry_run']:
+                self.stdout.write(f'Would hash {name}')
+                continue
+            try:
+                blob_name = adopt_file(name)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{name}: {e}'))
+                continue
+            if blob_name == name:
+                adopted += 1
+            else:
+                merged += 1
+                self.stdout.write(f'{name} -> {blob_name}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Would hash {len(names)} file(s).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Stored {adopted} file(s) as blobs, merged {merged} duplicate(s).'))
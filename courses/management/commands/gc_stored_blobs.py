@@ -0,0 +1,65 @@
+"""
+Delete stored document blobs that no application or avatar references.
+
+Usage:
+    python manage.py gc_stored_blobs
+    python manage.py gc_stored_blobs --hours 6 --dry-run
+
+Recounts the references to every blob first (see courses/storage.py), then
+deletes the blobs that have been unreferenced for longer than --hours. The
+grace period covers files saved by a request that hasn't attached them to
+its application yet. Scheduled nightly as the ifla-gc-stored-blobs cron job
+in render.yaml.
+"""
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import StoredBlob
+from courses.storage import count_blob_references, recount_blobs
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Recount stored blob references and delete blobs nothing uses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='How long a blob must be unreferenced before it is deleted')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        counts = count_blob_references()
+        recounted = 0
+        batch = []
+        for blob in StoredBlob.objects.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            batch.append(blob)
+            if len(batch) == BATCH_SIZE:
+                recounted += len(recount_blobs(batch, counts))
+                batch = []
+        recounted += len(recount_blobs(batch, counts))
+        self.stdout.write(f'Corrected {recounted} reference count(s).')
+
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        orphans = StoredBlob.objects.filter(ref_count=0, orphaned_at__lt=cutoff)
+        removed = freed = 0
+        for blob in orphans.iterator():
+            if options['dry_run']:
+                self.stdout.write(f'Would remove {blob.name} ({blob.size} bytes)')
+            else:
+                # Saving the same content again clears orphaned_at, which makes this a no-op
+                deleted, _ = StoredBlob.objects.filter(pk=blob.pk, ref_count=0, orphaned_at__lt=cutoff).delete()
+                if not deleted:
+                    continue
+                try:
+                    default_storage.delete(blob.name)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'{blob.name}: {e}'))
+                    continue
+            removed += 1
+            freed += blob.size
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {removed} unused blob(s), {freed} bytes.'))
@@ -0,0 +1,94 @@
+"""
+Build (or rebuild) the resized srcset derivatives for language images, the
+avatar thumbnails for users and the normalized application photos/signatures.
+
+Usage:
+    python manage.py generate_image_variants
+    python manage.py generate_image_variants --missing-only
+    python manage.py generate_image_variants --avatars
+    python manage.py generate_image_variants --applications
+
+Uploads build their derivatives in the background; this command runs the
+same tasks in-process for existing rows, e.g. after changing
+LANGUAGE_IMAGE_WIDTHS, User.AVATAR_SIZES or the encoder settings.
+Application images are only normalized once; already processed files are
+skipped so they aren't recompressed again.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from courses.models import EnrollmentApplication, Language
+from courses.tasks import generate_language_image_variants, normalize_application_images, refresh_user_avatar
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for uploaded language images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Skip languages (and users) that already have derivatives',
+        )
+        parser.add_argument(
+            '--avatars',
+            action='store_true',
+            help='Also (re)build user avatar thumbnails',
+        )
+        parser.add_argument(
+            '--applications',
+            action='store_true',
+            help='Also normalize application photos and signatures uploaded before the pipeline existed',
+        )
+
+    def handle(self, *args, **options):
+        languages = Language.objects.exclude(image_file='').exclude(image_file__isnull=True)
+        if options['missing_only']:
+            languages = languages.filter(image_variants={})
+
+        done = 0
+        for language in languages.only('id', 'name'):
+            try:
+                generate_language_image_variants(language.id)
+                done += 1
+                self.stdout.write(f'{language.name}: ok')
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{language.name}: {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated image variants for {done} language(s).'))
+
+        if options['applications']:
+            self._normalize_applications()
+
+        if options['avatars']:
+            self._generate_avatars(options['missing_only'])
+
+    def _normalize_applications(self):
+        applications = EnrollmentApplication.objects.only('id', 'photo', 'signature', 'image_thumbnails')
+
+        done = 0
+        for application in applications.iterator():
+            if not application.images_pending_normalization():
+                continue
+            try:
+                normalize_application_images(application.id)
+                done += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Application {application.id}: {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Normalized images for {done} application(s).'))
+
+    def _generate_avatars(self, missing_only):
+        users = get_user_model().objects.exclude(avatar='').exclude(avatar__isnull=True)
+        if missing_only:
+            users = users.filter(avatar_thumbnails={})
+
+        done = 0
+        for user in users.only('id', 'email'):
+            try:
+                refresh_user_avatar(user.id, force=not missing_only)
+                done += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{user.email}: {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated avatar thumbnails for {done} user(s).'))
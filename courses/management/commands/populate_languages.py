@@ -23,6 +23,7 @@ class Command(BaseCommand):
             },
             {
                 'name': 'Chinese',
+                'aliases': 'Mandarin',
                 'flag_emoji': '🇨🇳',
                 'description': 'Learn Mandarin Chinese and unlock opportunities in the world\'s most spoken language.',
                 'category': 1,
@@ -182,6 +183,7 @@ class Command(BaseCommand):
                 name=lang_data['name'],
                 defaults={
                     'flag_emoji': lang_data['flag_emoji'],
+                    'aliases': lang_data.get('aliases', ''),
                     'description': lang_data['description'],
                     'category': lang_data['category'],
                 }
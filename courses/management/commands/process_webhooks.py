@@ -0,0 +1,53 @@
+"""
+Apply stored Razorpay webhook events to enrollment applications.
+
+Usage:
+    python manage.py process_webhooks
+    python manage.py process_webhooks --loop --interval 2 --batch-size 200
+
+Without --loop, drains the inbox and exits (e.g. every minute from cron).
+With --loop it keeps running as a worker, sleeping --interval seconds when
+there is nothing to do. Several workers may run at once. See
+courses/webhooks.py.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from courses.models import WebhookEvent
+from courses.webhooks import MAX_ATTEMPTS, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Apply pending Razorpay webhook events in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the inbox is empty (with --loop)')
+
+    def handle(self, *args, **options):
+        passes = 0
+        last_id = 0
+        try:
+            while True:
+                last_id = process_batch(options['batch_size'], after_id=last_id)
+                if last_id is not None:
+                    continue
+                # End of the inbox; the next pass starts over, retrying failed events
+                passes += 1
+                last_id = 0
+                if not options['loop']:
+                    break
+                # Long-running worker: don't keep a connection the database has dropped
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        pending = WebhookEvent.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS).count()
+        failed = WebhookEvent.objects.filter(processed_at__isnull=True, attempts__gte=MAX_ATTEMPTS).count()
+        self.stdout.write(self.style.SUCCESS(f'Done after {passes} pass(es); {pending} event(s) still pending.'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} event(s) failed {MAX_ATTEMPTS} times and are no longer retried; see last_error.'))
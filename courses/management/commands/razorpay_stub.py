@@ -0,0 +1,40 @@
+"""
+Serve a fake Razorpay orders API for local development.
+
+Usage:
+    python manage.py razorpay_stub
+    python manage.py razorpay_stub --port 8765 --latency-ms 120 --error-rate 0.1
+
+Then run the site with RAZORPAY_BASE_URL=http://127.0.0.1:8765 (and any
+non-empty RAZORPAY_KEY_ID / RAZORPAY_KEY_SECRET). See courses/gateway_stub.py.
+"""
+from django.core.management.base import BaseCommand
+
+from courses.gateway_stub import StubGateway
+
+
+class Command(BaseCommand):
+    help = 'Run a local stub of the Razorpay orders API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=80, help='Delay before each response')
+        parser.add_argument('--jitter-ms', type=float, default=20, help='Random +/- spread of the delay')
+        parser.add_argument('--handshake-ms', type=float, default=60, help='Extra delay per new connection (TCP + TLS)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+
+    def handle(self, *args, **options):
+        server = StubGateway(
+            ('127.0.0.1', options['port']),
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            handshake=options['handshake_ms'] / 1000,
+            error_rate=options['error_rate'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Stub Razorpay API at {server.base_url} (Ctrl+C to stop)'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
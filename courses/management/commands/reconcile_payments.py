@@ -0,0 +1,44 @@
+"""
+Correct application payment statuses from Razorpay's records.
+
+Usage:
+    python manage.py reconcile_payments
+    python manage.py reconcile_payments --days 30 --workers 8 --dry-run
+
+Lists the payments and orders created in the last --days days and applies
+what webhooks missed: captured payments mark applications paid, failed ones
+mark pending applications failed. Meant to run nightly from cron. See
+courses/reconciliation.py.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from courses.payments import GatewayNotConfigured, GatewayUnavailable
+from courses.reconciliation import reconcile_payments
+
+
+class Command(BaseCommand):
+    help = 'Reconcile application payment statuses with Razorpay payments and orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=3, help='How far back to list payments and orders')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent gateway requests')
+        parser.add_argument('--dry-run', action='store_true', help='Report the corrections without saving them')
+
+    def handle(self, *args, **options):
+        until = timezone.now()
+        since = until - timedelta(days=options['days'])
+        try:
+            report = reconcile_payments(since, until, workers=max(1, options['workers']), dry_run=options['dry_run'])
+        except (GatewayNotConfigured, GatewayUnavailable) as e:
+            raise CommandError(str(e))
+
+        for application_id, reason in report['mismatched']:
+            self.stderr.write(f'Application {application_id}: amount mismatch ({reason}), left unchanged')
+        prefix = 'Would mark' if options['dry_run'] else 'Marked'
+        self.stdout.write(self.style.SUCCESS(
+            f"Listed {report['payments']} payment(s) and {report['orders']} order(s). "
+            f"{prefix} {report['paid']} application(s) paid and {report['failed']} failed."
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from courses.catalog import get_catalog
+from courses.page_cache import warm_cached_page
+from courses.views import languages_page_context
+
+
+class Command(BaseCommand):
+    help = 'Render cached public pages for the current catalog version (run after deploy/migrate)'
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        warm_cached_page('languages.html', languages_page_context)
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed languages page for catalog version {catalog.version} '
+            f'({len(catalog.languages)} languages)'
+        ))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:12
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def backfill_price_summary(apps, schema_editor):
+    Language = apps.get_model('courses', 'Language')
+    for language in Language.objects.annotate(
+        summary_min=Min('levels__price'),
+        summary_max=Max('levels__price'),
+        summary_count=Count('levels'),
+    ):
+        if language.summary_min is None:
+            price_range = 'Price TBD'
+        else:
+            price_range = f"₹{int(language.summary_min / 1000)}K - ₹{int(language.summary_max / 1000)}K"
+        Language.objects.filter(pk=language.pk).update(
+            min_price=language.summary_min,
+            max_price=language.summary_max,
+            levels_count=language.summary_count,
+            price_range=price_range,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_enrollmentapplication_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='language',
+            name='levels_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='price_range',
+            field=models.CharField(default='Price TBD', editable=False, max_length=50),
+        ),
+        migrations.RunPython(backfill_price_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:16
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch)).casefold()
+    return re.sub(r'[^a-z0-9]+', '-', value).strip('-')
+
+
+def backfill_slugs(apps, schema_editor):
+    Language = apps.get_model('courses', 'Language')
+    for language in Language.objects.all():
+        language.slug = _normalize(language.name)
+        language.save(update_fields=['slug'])
+    Language.objects.filter(name='Chinese', aliases='').update(aliases='Mandarin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_language_price_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='language',
+            name='aliases',
+            field=models.CharField(blank=True, help_text='Comma-separated alternative names, e.g. "Mandarin" for Chinese', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_language_slug_aliases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='language',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
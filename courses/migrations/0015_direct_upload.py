@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0014_dashboard_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('field_name', models.CharField(max_length=50)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('key', models.CharField(help_text='Storage name of the finished file', max_length=255)),
+                ('backend', models.CharField(choices=[('s3', 'S3 multipart'), ('local', 'Local signed chunks')], max_length=10)),
+                ('s3_upload_id', models.CharField(blank=True, max_length=255)),
+                ('received', models.PositiveBigIntegerField(default=0, help_text='Bytes written so far (local backend)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('consumed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='direct_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_direct_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollmentapplication',
+            name='image_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_application_image_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='date_of_birth',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='language',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='courses.language'),
+        ),
+    ]
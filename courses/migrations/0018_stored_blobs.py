@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:43
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_draft_applications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(help_text='Storage name of the file', max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('orphaned_at', models.DateTimeField(blank=True, db_index=True, help_text='When ref_count last dropped to zero', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='photo',
+            field=models.ImageField(blank=True, db_index=True, help_text='Upload your photo', null=True, storage=courses.storage.get_document_storage, upload_to='student_photos/'),
+        ),
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='signature',
+            field=models.ImageField(blank=True, db_index=True, help_text='Upload your signature image', null=True, storage=courses.storage.get_document_storage, upload_to='signatures/'),
+        ),
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='verification_document',
+            field=models.FileField(blank=True, db_index=True, help_text='Upload ID proof (PDF, Image, or Document)', null=True, storage=courses.storage.get_document_storage, upload_to='verification_documents/'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 08:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def snapshot_current_prices(apps, schema_editor):
+    """Existing rows get the levels' current prices; the price paid wasn't recorded"""
+    ApplicationLineItem = apps.get_model('courses', 'ApplicationLineItem')
+    CourseLevel = apps.get_model('courses', 'CourseLevel')
+    ApplicationLineItem.objects.update(
+        unit_price=Subquery(CourseLevel.objects.filter(pk=OuterRef('level_id')).values('price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_stored_blobs'),
+    ]
+
+    operations = [
+        # The levels many-to-many keeps its table; the through model takes it over
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ApplicationLineItem',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('application', models.ForeignKey(db_column='enrollmentapplication_id', on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='courses.enrollmentapplication')),
+                        ('level', models.ForeignKey(db_column='courselevel_id', on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='courses.courselevel')),
+                    ],
+                    options={
+                        'db_table': 'courses_enrollmentapplication_levels',
+                        'unique_together': {('application', 'level')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='enrollmentapplication',
+                    name='levels',
+                    field=models.ManyToManyField(related_name='applications', through='courses.ApplicationLineItem', to='courses.courselevel'),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddField(
+            model_name='applicationlineitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='applicationlineitem',
+            name='tax_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(snapshot_current_prices, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='enrollmentapplication',
+            index=models.Index(fields=['payment_status', 'paid_at'], name='courses_enr_payment_fefb1c_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_application_line_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollmentapplication',
+            name='razorpay_order_amount',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrollmentapplication',
+            name='razorpay_order_created_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
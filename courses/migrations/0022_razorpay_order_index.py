@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollmentapplication',
+            name='razorpay_order_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
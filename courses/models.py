@@ -1,5 +1,24 @@
+import re
+import uuid
+import unicodedata
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, ExpressionWrapper, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Round
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+from .storage import get_document_storage
+
+
+def normalize_language_name(value):
+    """Case-fold, strip accents and hyphenate a name, e.g. "Français" -> "francais" """
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch)).casefold()
+    return re.sub(r'[^a-z0-9]+', '-', value).strip('-')
 
 
 class Language(models.Model):
@@ -10,19 +29,82 @@ class Language(models.Model):
     ]
     
     name = models.CharField(max_length=100, unique=True)
+    # Normalized name used for lookups; set from name on save
+    slug = models.SlugField(max_length=100, editable=False, blank=True)
+    aliases = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text='Comma-separated alternative names, e.g. "Mandarin" for Chinese'
+    )
     flag_emoji = models.CharField(max_length=10, blank=True)
     description = models.TextField()
     category = models.IntegerField(choices=LANGUAGE_CATEGORIES, default=1)
     image_url = models.URLField(blank=True)
     image_file = models.ImageField(upload_to='languages/', blank=True, null=True)
+    # Resized copies of image_file by format and width, built in the background
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Price summary, kept in sync with the levels by refresh_price_summary()
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    levels_count = models.PositiveIntegerField(default=0, editable=False)
+    price_range = models.CharField(max_length=50, default='Price TBD', editable=False)
+    
     class Meta:
         ordering = ['name']
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        self.slug = normalize_language_name(self.name)
+        super().save(*args, **kwargs)
+    
+    @property
+    def webp_srcset(self):
+        from .images import srcset
+        return srcset(self.image_variants, 'webp')
+    
+    @property
+    def jpeg_srcset(self):
+        from .images import srcset
+        return srcset(self.image_variants, 'jpeg')
+    
+    @property
+    def search_keys(self):
+        """Normalized name and aliases this language can be looked up by"""
+        keys = [self.slug]
+        for alias in self.aliases.split(','):
+            key = normalize_language_name(alias)
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+    
+    @staticmethod
+    def format_price_range(min_price, max_price):
+        """Format a price range for display, e.g. "₹14K - ₹24K" """
+        if min_price is None or max_price is None:
+            return 'Price TBD'
+        return f"₹{int(min_price / 1000)}K - ₹{int(max_price / 1000)}K"
+    
+    @classmethod
+    def refresh_price_summary(cls, language_id):
+        """Recompute the price summary of one language from its levels"""
+        summary = CourseLevel.objects.filter(language_id=language_id).aggregate(
+            min_price=Min('price'),
+            max_price=Max('price'),
+            levels_count=Count('id'),
+        )
+        # update() also moves updated_at, which the catalog Last-Modified relies on
+        cls.objects.filter(pk=language_id).update(
+            min_price=summary['min_price'],
+            max_price=summary['max_price'],
+            levels_count=summary['levels_count'],
+            price_range=cls.format_price_range(summary['min_price'], summary['max_price']),
+            updated_at=timezone.now(),
+        )
 
 
 class CourseLevel(models.Model):
@@ -71,6 +153,7 @@ class ClassSchedule(models.Model):
     is_online = models.BooleanField(default=False)
     meeting_link = models.URLField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['day_of_week', 'start_time']
@@ -95,6 +178,7 @@ class Enrollment(models.Model):
     enrolled_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     progress_percentage = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['user', 'course_level']
@@ -120,6 +204,7 @@ class Certificate(models.Model):
     approved_by = models.ForeignKey('accounts.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='approved_certificates')
     certificate_file = models.FileField(upload_to='certificates/', blank=True, null=True)
     verification_url = models.URLField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-issued_date']
@@ -148,6 +233,7 @@ class Invoice(models.Model):
     paid_date = models.DateField(null=True, blank=True)
     payment_method = models.CharField(max_length=50, blank=True)
     invoice_file = models.FileField(upload_to='invoices/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-issued_date']
@@ -167,12 +253,13 @@ class EnrollmentApplication(models.Model):
     ]
     
     user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='enrollment_applications')
-    language = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='applications')
-    levels = models.ManyToManyField(CourseLevel, related_name='applications')
+    # Only drafts may leave language and date of birth empty
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, related_name='applications', null=True, blank=True)
+    levels = models.ManyToManyField(CourseLevel, through='ApplicationLineItem', related_name='applications')
     
     # Personal Information
     full_name = models.CharField(max_length=200)
-    date_of_birth = models.DateField()
+    date_of_birth = models.DateField(null=True, blank=True)
     phone_number = models.CharField(max_length=17)
     email = models.EmailField()
     address = models.TextField(help_text='Full address', blank=True)
@@ -180,24 +267,33 @@ class EnrollmentApplication(models.Model):
     # Personal Photo
     photo = models.ImageField(
         upload_to='student_photos/',
+        storage=get_document_storage,
         help_text='Upload your photo',
         blank=True,
-        null=True
+        null=True,
+        db_index=True
     )
     
     # Verification Documents
     verification_document = models.FileField(
         upload_to='verification_documents/',
+        storage=get_document_storage,
         help_text='Upload ID proof (PDF, Image, or Document)',
         blank=True,
-        null=True
+        null=True,
+        db_index=True
     )
     signature = models.ImageField(
         upload_to='signatures/',
+        storage=get_document_storage,
         help_text='Upload your signature image',
         blank=True,
-        null=True
+        null=True,
+        db_index=True
     )
+    # {"photo": {"name": normalized file, "thumbnail": name}, "signature": {...}},
+    # filled in by normalize_application_images after upload
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     
     # Status and Metadata
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
@@ -205,9 +301,12 @@ class EnrollmentApplication(models.Model):
     payment_reference = models.CharField(max_length=100, blank=True)
     
     # Payment fields
-    razorpay_order_id = models.CharField(max_length=100, blank=True)
+    razorpay_order_id = models.CharField(max_length=100, blank=True, db_index=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True)
     razorpay_signature = models.CharField(max_length=255, blank=True)
+    # Amount (paise) and creation time of razorpay_order_id, so the order can be reused
+    razorpay_order_amount = models.PositiveIntegerField(null=True, blank=True)
+    razorpay_order_created_at = models.DateTimeField(null=True, blank=True)
     payment_status = models.CharField(
         max_length=20,
         choices=[
@@ -243,13 +342,166 @@ class EnrollmentApplication(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Revenue reports: paid applications by payment date
+            models.Index(fields=['payment_status', 'paid_at']),
+        ]
     
     def __str__(self):
-        return f"{self.full_name} - {self.language.name} ({self.status})"
+        language_name = self.language.name if self.language_id else 'No language'
+        return f"{self.full_name} - {language_name} ({self.status})"
+    
+    # Uploaded files, stored once per distinct content (courses/storage.py)
+    DOCUMENT_FIELDS = ('photo', 'verification_document', 'signature')
+    # Image fields re-encoded and thumbnailed in the background after upload
+    NORMALIZED_IMAGE_FIELDS = ('photo', 'signature')
+    
+    def images_pending_normalization(self):
+        """Image fields whose current file hasn't been normalized yet"""
+        thumbnails = self.image_thumbnails or {}
+        return [
+            field_name for field_name in self.NORMALIZED_IMAGE_FIELDS
+            if getattr(self, field_name)
+            and thumbnails.get(field_name, {}).get('name') != getattr(self, field_name).name
+        ]
+    
+    def image_thumbnail_url(self, field_name):
+        """URL of the photo/signature thumbnail, falling back to the file itself"""
+        field_file = getattr(self, field_name)
+        if not field_file:
+            return ''
+        entry = (self.image_thumbnails or {}).get(field_name, {})
+        if entry.get('thumbnail') and entry.get('name') == field_file.name:
+            from django.core.files.storage import default_storage
+            return default_storage.url(entry['thumbnail'])
+        return field_file.url
+    
+    @property
+    def photo_thumbnail_url(self):
+        return self.image_thumbnail_url('photo')
+    
+    @property
+    def signature_thumbnail_url(self):
+        return self.image_thumbnail_url('signature')
+    
+    @property
+    def amount_in_paise(self):
+        """total_amount in the smallest currency unit, as Razorpay expects"""
+        return int((self.total_amount * 100).to_integral_value())
+    
+    def reusable_razorpay_order(self, amount):
+        """Whether the stored Razorpay order is recent enough to be paid again for amount (paise)"""
+        return bool(
+            self.razorpay_order_id
+            and self.razorpay_order_amount == amount
+            and self.razorpay_order_created_at
+            and timezone.now() - self.razorpay_order_created_at < timedelta(seconds=settings.RAZORPAY_ORDER_TTL)
+        )
     
     def calculate_total_amount(self):
-        """Calculate total amount based on selected levels"""
-        total = sum(level.price for level in self.levels.all())
-        self.total_amount = total
-        return total
+        """Snapshot the selected levels' prices and tax onto the line items and total them in SQL"""
+        price = CourseLevel.objects.filter(pk=OuterRef('level_id')).values('price')[:1]
+        tax_rate = Decimal(settings.APPLICATION_TAX_RATE)
+        self.line_items.update(
+            unit_price=Subquery(price),
+            tax_amount=Round(ExpressionWrapper(Subquery(price) * tax_rate, output_field=models.DecimalField()), 2),
+        )
+        self.total_amount = self.line_items.aggregate(total=ApplicationLineItem.TOTAL)['total'] or 0
+        return self.total_amount
 
+
+class ApplicationLineItem(models.Model):
+    """A course level on an application, with its price and tax when the application was submitted.
+    
+    Rows are added with zero amounts while the application is a draft;
+    EnrollmentApplication.calculate_total_amount() fills them in on submit,
+    so repricing a level later doesn't change what was charged.
+    """
+    application = models.ForeignKey(EnrollmentApplication, on_delete=models.CASCADE, related_name='line_items', db_column='enrollmentapplication_id')
+    level = models.ForeignKey(CourseLevel, on_delete=models.CASCADE, related_name='line_items', db_column='courselevel_id')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    # Amount charged for a set of line items, for aggregate()/annotate()
+    TOTAL = Sum(F('unit_price') + F('tax_amount'))
+    
+    class Meta:
+        # The table Django created for the plain levels many-to-many
+        db_table = 'courses_enrollmentapplication_levels'
+        unique_together = [('application', 'level')]
+    
+    def __str__(self):
+        return f"{self.level} on application {self.application_id}"
+
+
+class DirectUpload(models.Model):
+    """A file the browser uploads straight to storage, in resumable chunks.
+    
+    The enrollment form then submits the token instead of the file bytes.
+    See courses/uploads.py.
+    """
+    BACKEND_CHOICES = [
+        ('s3', 'S3 multipart'),
+        ('local', 'Local signed chunks'),
+    ]
+    
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='direct_uploads')
+    field_name = models.CharField(max_length=50)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    key = models.CharField(max_length=255, help_text='Storage name of the finished file')
+    backend = models.CharField(max_length=10, choices=BACKEND_CHOICES)
+    s3_upload_id = models.CharField(max_length=255, blank=True)
+    received = models.PositiveBigIntegerField(default=0, help_text='Bytes written so far (local backend)')
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    consumed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.field_name} upload {self.token} ({self.user_id})"
+
+
+class StoredBlob(models.Model):
+    """One stored copy of an uploaded document, shared by every field with the same content.
+    
+    See courses/storage.py. ref_count is the number of field values naming
+    this blob; unreferenced blobs are deleted by gc_stored_blobs.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True, help_text='Storage name of the file')
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    orphaned_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text='When ref_count last dropped to zero')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class WebhookEvent(models.Model):
+    """A verified Razorpay webhook delivery, stored as received.
+    
+    The webhook view only appends rows (one per Razorpay event id);
+    process_webhooks applies them to applications. See courses/webhooks.py.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            # The worker's queue: unprocessed events in arrival order
+            models.Index(fields=['processed_at', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
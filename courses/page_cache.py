@@ -0,0 +1,69 @@
+"""
+Full-response cache for public catalog pages.
+
+Each page is rendered once per catalog version and visitor state (anonymous
+or signed in). The only per-request parts of these pages are the CSRF token
+and the signed-in user's name, so the cached HTML carries placeholders for
+them that are filled in on every hit.
+"""
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+from django.utils.text import Truncator
+
+from .catalog import get_catalog_version
+
+
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+CSRF_PLACEHOLDER = '__IFLA_CSRF_TOKEN__'
+NAME_PLACEHOLDER = '__IFLA_DISPLAY_NAME__'
+
+
+class _PlaceholderUser:
+    """Signed-in user stand-in whose name is filled in per request"""
+    is_authenticated = True
+    is_anonymous = False
+    first_name = NAME_PLACEHOLDER
+    email = NAME_PLACEHOLDER
+
+
+def _page_cache_key(template_name, version, authenticated):
+    state = 'auth' if authenticated else 'anon'
+    return f'courses:page:{template_name}:{version}:{state}'
+
+
+def render_cached_page(template_name, get_context, authenticated, version=None):
+    """Render a page with placeholders and store it for the catalog version"""
+    version = version or get_catalog_version()
+    context = get_context()
+    context['user'] = _PlaceholderUser() if authenticated else AnonymousUser()
+    context['csrf_token'] = CSRF_PLACEHOLDER
+    html = render_to_string(template_name, context)
+    cache.set(_page_cache_key(template_name, version, authenticated), html, PAGE_CACHE_TIMEOUT)
+    return html
+
+
+def serve_cached_page(request, template_name, get_context):
+    """Return the cached page for the visitor, rendering it on a miss"""
+    authenticated = request.user.is_authenticated
+    version = get_catalog_version()
+    html = cache.get(_page_cache_key(template_name, version, authenticated))
+    if html is None:
+        html = render_cached_page(template_name, get_context, authenticated, version)
+
+    html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    if authenticated:
+        user = request.user
+        display_name = Truncator(user.first_name or user.email).words(1, truncate=' …')
+        html = html.replace(NAME_PLACEHOLDER, conditional_escape(display_name))
+    return HttpResponse(html)
+
+
+def warm_cached_page(template_name, get_context):
+    """Render both visitor variants of a page ahead of traffic"""
+    version = get_catalog_version()
+    for authenticated in (False, True):
+        render_cached_page(template_name, get_context, authenticated, version)
@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param
+
+
+class CatalogPagination(LimitOffsetPagination):
+    """Opt-in limit/offset paging for catalog lists.
+    
+    Without a valid ?limit= the full list is returned, as before, so existing
+    clients keep working.
+    """
+    default_limit = None
+    max_limit = 100
+
+    def paginate_list(self, items, request):
+        """Return the requested page, or None when the request isn't paged"""
+        return self.paginate_queryset(items, Request(request))
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+
+class DashboardCursorPagination(CursorPagination):
+    """Cursor paging for one collection of the dashboard API.
+    
+    Each collection reads its own ?<name>_cursor= parameter, and its next and
+    previous links ask for that collection only (?include=<name>).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def __init__(self, name):
+        self.name = name
+        self.cursor_query_param = f'{name}_cursor'
+
+    def _only_this_collection(self, url):
+        return replace_query_param(url, 'include', self.name) if url else url
+
+    def get_page_data(self, data):
+        return OrderedDict([
+            ('next', self._only_this_collection(self.get_next_link())),
+            ('previous', self._only_this_collection(self.get_previous_link())),
+            ('results', data),
+        ])
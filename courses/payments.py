@@ -0,0 +1,207 @@
+"""
+Razorpay API access.
+
+razorpay.Client opens a new requests.Session, and so a new TLS connection,
+every time one is built, and sends requests without a timeout. This module
+keeps one client per process instead, built on first use over a pooled
+keep-alive session, and sends every call through call_gateway(), which adds
+
+- connect/read timeouts (RAZORPAY_CONNECT_TIMEOUT, RAZORPAY_READ_TIMEOUT);
+- up to RAZORPAY_MAX_RETRIES retries with jittered exponential backoff.
+  Reads are retried on any transport or 5xx error. Writes (creating an
+  order) are only retried when the connection was never made, so a request
+  Razorpay may have received is not sent twice;
+- a circuit breaker: after RAZORPAY_BREAKER_THRESHOLD consecutive failures,
+  calls fail immediately with GatewayUnavailable for RAZORPAY_BREAKER_RESET
+  seconds, then a single trial call decides whether to close it again.
+
+`manage.py razorpay_stub` serves a fake API locally for development and
+for `manage.py benchmark_payment_gateway`.
+"""
+import os
+import random
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from razorpay.errors import GatewayError, ServerError
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Upper bound of the first retry's delay in seconds; doubled per attempt
+RETRY_BACKOFF = 0.2
+
+
+class GatewayNotConfigured(Exception):
+    """Razorpay keys are missing from the settings"""
+
+
+class GatewayUnavailable(Exception):
+    """Razorpay can't be reached or keeps failing; the call was not completed"""
+
+
+class CircuitBreaker:
+    """Counts consecutive failures and refuses calls while the circuit is open"""
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now; after reset_after one trial call is let through"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_after:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                # A failed trial restarts the wait
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if self.trial_running else 'open'
+
+
+class PooledClient(razorpay.Client):
+    """razorpay.Client that doesn't look up its package version on every request"""
+
+    _version = None
+
+    def _get_version(self):
+        if PooledClient._version is None:
+            PooledClient._version = super()._get_version()
+        return PooledClient._version
+
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+_breaker = None
+
+
+def _build_session():
+    session = requests.Session()
+    # Retries are handled in call_gateway(), where it's known whether the call is safe to repeat
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RAZORPAY_POOL_SIZE, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_client():
+    """This process's Razorpay client; rebuilt when the keys change or after a fork"""
+    global _client, _client_key, _breaker
+    key_id = getattr(settings, 'RAZORPAY_KEY_ID', '')
+    key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
+    if not key_id or not key_secret:
+        raise GatewayNotConfigured('Payment gateway not configured')
+
+    key = (key_id, key_secret, settings.RAZORPAY_BASE_URL, os.getpid())
+    if _client_key != key:
+        with _client_lock:
+            if _client_key != key:
+                _client = PooledClient(
+                    session=_build_session(),
+                    auth=(key_id, key_secret),
+                    base_url=settings.RAZORPAY_BASE_URL,
+                )
+                _breaker = CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET)
+                _client_key = key
+    return _client
+
+
+def get_breaker():
+    """The circuit breaker guarding this process's client"""
+    get_client()
+    return _breaker
+
+
+def _never_connected(error):
+    """Whether a transport error happened before the request could reach Razorpay"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _retryable(error, idempotent):
+    if isinstance(error, requests.RequestException):
+        return idempotent or _never_connected(error)
+    return idempotent and isinstance(error, (ServerError, GatewayError))
+
+
+def call_gateway(operation, idempotent=False):
+    """Run operation(client, timeout) against Razorpay with retries and the circuit breaker.
+
+    Raises GatewayUnavailable when the circuit is open or the gateway keeps
+    failing, and Razorpay's own errors (e.g. BadRequestError) otherwise.
+    """
+    client = get_client()
+    breaker = _breaker
+    timeout = (settings.RAZORPAY_CONNECT_TIMEOUT, settings.RAZORPAY_READ_TIMEOUT)
+    attempts = settings.RAZORPAY_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise GatewayUnavailable('Payment gateway is temporarily unavailable, please try again shortly')
+        try:
+            result = operation(client, timeout)
+        except (requests.RequestException, ServerError, GatewayError) as e:
+            breaker.record_failure()
+            if attempt + 1 < attempts and _retryable(e, idempotent):
+                # Full jitter keeps retrying workers from arriving together
+                time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+                continue
+            if isinstance(e, requests.RequestException):
+                raise GatewayUnavailable(f'Payment gateway did not respond: {e}') from e
+            raise
+        except Exception:
+            # A 4xx reply or an unreadable body: the gateway itself is up
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+
+def create_order(data):
+    """Create a Razorpay order; not retried once the request may have been received"""
+    return call_gateway(lambda client, timeout: client.order.create(data=data, timeout=timeout))
+
+
+def fetch_order(order_id):
+    return call_gateway(lambda client, timeout: client.order.fetch(order_id, timeout=timeout), idempotent=True)
+
+
+def fetch_order_payments(order_id):
+    return call_gateway(lambda client, timeout: client.order.payments(order_id, timeout=timeout), idempotent=True)
+
+
+def list_payments(params):
+    """One page of payments; params as for GET /v1/payments (from, to, count, skip)"""
+    return call_gateway(lambda client, timeout: client.payment.all(params, timeout=timeout), idempotent=True)
+
+
+def list_orders(params):
+    """One page of orders; params as for GET /v1/orders (from, to, count, skip)"""
+    return call_gateway(lambda client, timeout: client.order.all(params, timeout=timeout), idempotent=True)
@@ -0,0 +1,49 @@
+"""
+Enrollment provisioning for approved applications.
+
+provision_enrollments() turns approved applications into one active
+Enrollment per (student, level) on their line items with a single
+INSERT ... ON CONFLICT DO NOTHING per batch. Enrollments that already exist
+are left exactly as they are, as get_or_create() would, but without a
+SELECT per level and without the IntegrityError get_or_create() can hit
+when two requests provision the same application at once.
+
+By default only paid applications are provisioned. Staff approving an
+application explicitly pass paid_only=False, which also covers fees paid
+outside Razorpay.
+"""
+from django.db import transaction
+
+from .dashboard_cache import ENROLLMENTS, invalidate_dashboard
+from .models import ApplicationLineItem, Enrollment
+
+BATCH_SIZE = 500
+
+
+def provision_enrollments(applications, paid_only=True):
+    """Create the missing enrollments for applications (instances, ids or a queryset).
+
+    Only approved applications are provisioned, and with paid_only only
+    those whose payment succeeded; others are skipped. Returns the number of
+    (student, level) pairs provisioned, including ones that were already
+    enrolled.
+    """
+    line_items = ApplicationLineItem.objects.filter(application__in=applications, application__status='approved')
+    if paid_only:
+        line_items = line_items.filter(application__payment_status='success')
+    pairs = set(line_items.values_list('application__user_id', 'level_id'))
+    if not pairs:
+        return 0
+
+    with transaction.atomic():
+        Enrollment.objects.bulk_create(
+            [
+                Enrollment(user_id=user_id, course_level_id=level_id, status='active', progress_percentage=0)
+                for user_id, level_id in sorted(pairs)
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # bulk_create() sends no post_save, so the enrollment signals don't fire
+        invalidate_dashboard({user_id for user_id, _ in pairs}, ENROLLMENTS)
+    return len(pairs)
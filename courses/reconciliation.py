@@ -0,0 +1,149 @@
+"""
+Payment reconciliation against Razorpay.
+
+Webhooks can be missed (misconfigured secret, downtime, events that failed
+process_webhooks for good). reconcile_payments() lists the payments and
+orders Razorpay created in a time window, matches them to applications by
+the indexed razorpay_order_id, and corrects payment_status in bulk:
+
+- a captured payment, or an order Razorpay reports as paid, marks the
+  application paid (amounts must match the order we created);
+- a failed payment marks a pending application failed.
+
+Listing pages are fetched concurrently on a bounded thread pool; the
+threads only talk to the gateway, all database work stays on the caller's
+thread. The applications are read again under SELECT ... FOR UPDATE just
+before the fixes are written, so one settled meanwhile by a webhook or
+payment_success is left alone.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard_cache import APPLICATIONS, invalidate_dashboard
+from .models import EnrollmentApplication
+from .payments import fetch_order_payments, list_orders, list_payments
+
+# Razorpay's largest page
+PAGE_SIZE = 100
+# Order ids per IN (...) lookup, below SQLite's variable limit
+LOOKUP_BATCH = 500
+
+PAYMENT_FIELDS = ['payment_status', 'payment_reference', 'razorpay_payment_id', 'status', 'paid_at', 'updated_at']
+
+
+def fetch_all_pages(fetch_page, pool, workers, page_size=PAGE_SIZE):
+    """Every item of a paged listing; fetch_page(skip) returns one collection page.
+
+    Up to `workers` pages are requested at once; a short page marks the end.
+    """
+    items = {}
+    pending = set()
+    next_skip = 0
+    exhausted = False
+    for _ in range(workers):
+        pending.add(pool.submit(fetch_page, next_skip))
+        next_skip += page_size
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            page = future.result().get('items', [])
+            # Keyed on id: overlapping pages can't double count
+            items.update((item['id'], item) for item in page)
+            if len(page) < page_size:
+                exhausted = True
+            elif not exhausted:
+                pending.add(pool.submit(fetch_page, next_skip))
+                next_skip += page_size
+    return list(items.values())
+
+
+def _paid_at(payment):
+    return datetime.fromtimestamp(payment['created_at'], tz=dt_timezone.utc) if payment.get('created_at') else timezone.now()
+
+
+def _unsettled_applications(order_ids, lock=False):
+    """Applications for order_ids whose payment isn't settled yet, by order id
+
+    With lock, the rows are locked until the end of the transaction.
+    """
+    order_ids = sorted(order_ids)
+    applications = {}
+    for start in range(0, len(order_ids), LOOKUP_BATCH):
+        queryset = EnrollmentApplication.objects.select_for_update() if lock else EnrollmentApplication.objects
+        queryset = queryset.filter(
+            razorpay_order_id__in=order_ids[start:start + LOOKUP_BATCH]
+        ).exclude(payment_status__in=['success', 'refunded']).only(
+            'id', 'user_id', 'status', 'razorpay_order_id', 'razorpay_order_amount', *PAYMENT_FIELDS
+        )
+        applications.update((application.razorpay_order_id, application) for application in queryset)
+    return applications
+
+
+def reconcile_payments(since, until, workers=4, dry_run=False):
+    """Bring applications in line with Razorpay's payments and orders created between since and until.
+
+    Returns a report: {"payments", "orders": counts listed, "paid", "failed":
+    applications corrected, "mismatched": [(application id, reason)]}.
+    """
+    window = {'from': int(since.timestamp()), 'to': int(until.timestamp()), 'count': PAGE_SIZE}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        payments = fetch_all_pages(lambda skip: list_payments({**window, 'skip': skip}), pool, workers)
+        orders = fetch_all_pages(lambda skip: list_orders({**window, 'skip': skip}), pool, workers)
+
+        captured = {}
+        failed = {}
+        for payment in payments:
+            if not payment.get('order_id'):
+                continue
+            if payment.get('status') == 'captured':
+                captured[payment['order_id']] = payment
+            elif payment.get('status') == 'failed':
+                failed.setdefault(payment['order_id'], payment)
+        paid_orders = {order['id'] for order in orders if order.get('status') == 'paid'}
+
+        applications = _unsettled_applications(set(captured) | set(failed) | paid_orders)
+
+        # Paid orders whose payment was made before the window: ask for it
+        missing = [order_id for order_id in paid_orders if order_id in applications and order_id not in captured]
+        for order_id, page in zip(missing, pool.map(fetch_order_payments, missing)):
+            for payment in page.get('items', []):
+                if payment.get('status') == 'captured':
+                    captured[order_id] = payment
+
+    report = {'payments': len(payments), 'orders': len(orders), 'paid': 0, 'failed': 0, 'mismatched': []}
+    with transaction.atomic():
+        # The rows read above may have been settled by a webhook or payment_success
+        # while the gateway was being paged; decide on locked, current copies
+        current = _unsettled_applications(applications, lock=True)
+        changed = []
+        now = timezone.now()
+        for application in current.values():
+            order_id = application.razorpay_order_id
+            payment = captured.get(order_id)
+            if payment is not None:
+                if application.razorpay_order_amount is not None and payment.get('amount') != application.razorpay_order_amount:
+                    report['mismatched'].append((application.id, f"paid {payment.get('amount')}, order was {application.razorpay_order_amount}"))
+                    continue
+                application.payment_status = 'success'
+                application.payment_reference = payment['id']
+                application.razorpay_payment_id = payment['id']
+                if application.status == 'payment_pending':
+                    application.status = 'submitted'
+                application.paid_at = _paid_at(payment)
+                report['paid'] += 1
+            elif order_id in failed and application.payment_status == 'pending':
+                application.payment_status = 'failed'
+                report['failed'] += 1
+            else:
+                continue
+            # bulk_update skips auto_now and signals
+            application.updated_at = now
+            changed.append(application)
+
+        if changed and not dry_run:
+            EnrollmentApplication.objects.bulk_update(changed, PAYMENT_FIELDS, batch_size=LOOKUP_BATCH)
+            invalidate_dashboard({application.user_id for application in changed}, APPLICATIONS)
+    return report
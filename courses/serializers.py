@@ -1,24 +1,97 @@
+import os
+
 from rest_framework import serializers
 from .models import Language, CourseLevel, Enrollment, ClassSchedule, Certificate, Invoice, EnrollmentApplication
 
 
-class CourseLevelSerializer(serializers.ModelSerializer):
+class EagerLoadingMixin:
+    """Lets a serializer declare the relations it reads.
+    
+    Views pass their base queryset through setup_eager_loading() so the
+    query count stays fixed however many rows are serialized.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
+class SparseFieldsMixin:
+    """Lets callers trim a serializer's output to the fields they need.
+    
+    Pass fields=[...] to keep only those fields. Relations listed in
+    expandable_fields are then left out unless they are named in fields or
+    expand. Without fields the full representation is returned.
+    """
+    expandable_fields = ()
+    
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            keep = set(fields) | (set(expand) & set(self.expandable_fields))
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+    
+    @classmethod
+    def parse_fieldset(cls, params):
+        """Read ?fields= and ?expand= into normalized tuples of known field names
+        
+        Raises ValidationError listing the valid names if ?fields= names an
+        unknown field.
+        """
+        known = set(cls.Meta.fields)
+        fields = None
+        if params.get('fields'):
+            requested = {name.strip() for name in params['fields'].split(',')} - {''}
+            unknown = requested - known
+            if unknown:
+                raise serializers.ValidationError({
+                    'error': f"Unknown field(s): {', '.join(sorted(unknown))}",
+                    'valid_fields': sorted(known),
+                })
+            fields = tuple(sorted(requested)) or None
+        expand = tuple(sorted(
+            set(cls.expandable_fields) & {name.strip() for name in params.get('expand', '').split(',')}
+        ))
+        return fields, expand
+
+
+class CourseLevelSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for CourseLevel model"""
     level_display = serializers.CharField(source='get_level_display', read_only=True)
     language_name = serializers.CharField(source='language.name', read_only=True)
     
+    select_related_fields = ('language',)
+    
     class Meta:
         model = CourseLevel
         fields = ['id', 'level', 'level_display', 'price', 'duration_weeks', 'description', 'language_name', 'language']
 
 
-class LanguageSerializer(serializers.ModelSerializer):
+class LanguageSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Language model"""
     levels = CourseLevelSerializer(many=True, read_only=True)
+    image_srcset = serializers.SerializerMethodField()
+    
+    expandable_fields = ('levels',)
+    # Prefetching levels also fills each level's language, so language_name is free
+    prefetch_related_fields = ('levels',)
     
     class Meta:
         model = Language
-        fields = ['id', 'name', 'flag_emoji', 'description', 'category', 'image_url', 'image_file', 'levels']
+        fields = ['id', 'name', 'aliases', 'flag_emoji', 'description', 'category', 'image_url', 'image_file', 'image_srcset', 'min_price', 'max_price', 'levels_count', 'price_range', 'levels']
+    
+    def get_image_srcset(self, obj):
+        """srcset strings for the resized copies of image_file, per format"""
+        if not obj.image_variants:
+            return None
+        return {'webp': obj.webp_srcset, 'jpeg': obj.jpeg_srcset}
 
 
 class ClassScheduleSerializer(serializers.ModelSerializer):
@@ -47,7 +120,7 @@ class CertificateSerializer(serializers.ModelSerializer):
         fields = ['id', 'certificate_number', 'issued_date', 'certificate_file', 'verification_url']
 
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for Enrollment model"""
     course_level = CourseLevelSerializer(read_only=True)
     language_name = serializers.CharField(source='course_level.language.name', read_only=True)
@@ -56,17 +129,23 @@ class EnrollmentSerializer(serializers.ModelSerializer):
     invoices = InvoiceSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
+    select_related_fields = ('course_level__language', 'class_schedule', 'certificate')
+    prefetch_related_fields = ('invoices',)
+    
     class Meta:
         model = Enrollment
         fields = ['id', 'course_level', 'language_name', 'class_schedule', 'status', 'status_display', 'enrolled_at', 'completed_at', 'progress_percentage', 'certificate', 'invoices']
 
 
-class EnrollmentApplicationSerializer(serializers.ModelSerializer):
+class EnrollmentApplicationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Serializer for EnrollmentApplication model"""
     language_name = serializers.CharField(source='language.name', read_only=True)
     levels_data = CourseLevelSerializer(source='levels', many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     
+    select_related_fields = ('language',)
+    prefetch_related_fields = ('levels__language',)
+    
     class Meta:
         model = EnrollmentApplication
         fields = [
@@ -78,3 +157,113 @@ class EnrollmentApplicationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'total_amount', 'created_at', 'submitted_at']
 
+
+
+class DashboardEnrollmentSerializer(EnrollmentSerializer):
+    """Enrollment row for the dashboard API; certificates and invoices are listed separately"""
+    
+    select_related_fields = ('course_level__language', 'class_schedule')
+    prefetch_related_fields = ()
+    
+    class Meta(EnrollmentSerializer.Meta):
+        fields = ['id', 'course_level', 'language_name', 'class_schedule', 'status', 'status_display', 'enrolled_at', 'completed_at', 'progress_percentage', 'updated_at']
+
+
+class DashboardCertificateSerializer(EagerLoadingMixin, CertificateSerializer):
+    """Certificate with the course it was issued for"""
+    language_name = serializers.CharField(source='enrollment.course_level.language.name', read_only=True)
+    level_display = serializers.CharField(source='enrollment.course_level.get_level_display', read_only=True)
+    
+    select_related_fields = ('enrollment__course_level__language',)
+    
+    class Meta(CertificateSerializer.Meta):
+        fields = CertificateSerializer.Meta.fields + ['enrollment', 'language_name', 'level_display', 'updated_at']
+
+
+class DashboardInvoiceSerializer(EagerLoadingMixin, InvoiceSerializer):
+    """Invoice with the enrollment it belongs to"""
+    
+    class Meta(InvoiceSerializer.Meta):
+        fields = InvoiceSerializer.Meta.fields + ['enrollment', 'updated_at']
+
+
+class DashboardApplicationSerializer(EnrollmentApplicationSerializer):
+    """Application row for the dashboard API"""
+    
+    class Meta(EnrollmentApplicationSerializer.Meta):
+        fields = EnrollmentApplicationSerializer.Meta.fields + ['payment_status', 'updated_at']
+
+
+class DashboardScheduleSerializer(EagerLoadingMixin, ClassScheduleSerializer):
+    """Assigned class with the course it belongs to"""
+    language_name = serializers.CharField(source='course_level.language.name', read_only=True)
+    level_display = serializers.CharField(source='course_level.get_level_display', read_only=True)
+    
+    select_related_fields = ('course_level__language',)
+    
+    class Meta(ClassScheduleSerializer.Meta):
+        fields = ClassScheduleSerializer.Meta.fields + ['course_level', 'language_name', 'level_display', 'updated_at']
+
+
+class EnrollmentDraftSerializer(serializers.ModelSerializer):
+    """Partial updates of a draft application; every field may be empty until submit"""
+    language = serializers.PrimaryKeyRelatedField(queryset=Language.objects.all(), allow_null=True, required=False)
+    levels = serializers.PrimaryKeyRelatedField(queryset=CourseLevel.objects.all(), many=True, required=False)
+    files = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = EnrollmentApplication
+        fields = [
+            'id', 'language', 'levels', 'full_name', 'date_of_birth', 'phone_number', 'email', 'address',
+            'schedule_type', 'preferred_hour', 'photo', 'verification_document', 'signature', 'files', 'updated_at',
+        ]
+        read_only_fields = ['id', 'updated_at']
+        extra_kwargs = {
+            'full_name': {'allow_blank': True, 'required': False},
+            'phone_number': {'allow_blank': True, 'required': False},
+            'email': {'allow_blank': True, 'required': False},
+            'photo': {'write_only': True, 'required': False},
+            'verification_document': {'write_only': True, 'required': False},
+            'signature': {'write_only': True, 'required': False},
+        }
+    
+    def get_files(self, obj):
+        """Saved documents: field -> {"name", "url"} (thumbnails for images), or None"""
+        files = {}
+        for field_name in obj.DOCUMENT_FIELDS:
+            field_file = getattr(obj, field_name)
+            if not field_file:
+                files[field_name] = None
+                continue
+            if field_name in obj.NORMALIZED_IMAGE_FIELDS:
+                url = obj.image_thumbnail_url(field_name)
+            else:
+                url = field_file.url
+            files[field_name] = {'name': os.path.basename(field_file.name), 'url': url}
+        return files
+    
+    def to_internal_value(self, data):
+        if data.get('date_of_birth') == '':
+            # A cleared date input sends an empty string
+            data = data.copy()
+            data['date_of_birth'] = None
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        language = attrs.get('language', self.instance.language if self.instance else None)
+        levels = attrs.get('levels')
+        if levels and any(level.language_id != getattr(language, 'id', None) for level in levels):
+            raise serializers.ValidationError({'levels': 'Levels must belong to the selected language'})
+        return attrs
+    
+    def update(self, instance, validated_data):
+        levels = validated_data.pop('levels', None)
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        # Only the fields sent: a concurrent autosave or image normalization may own the rest
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if levels is not None:
+            instance.levels.set(levels)
+        elif 'language' in validated_data:
+            instance.levels.remove(*instance.levels.exclude(language=instance.language_id))
+        return instance
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .dashboard_cache import ENROLLMENTS, CERTIFICATES, INVOICES, APPLICATIONS, invalidate_dashboard
+from .models import (
+    Language, CourseLevel, ClassSchedule, Enrollment, Certificate, Invoice, EnrollmentApplication
+)
+from .storage import claim_blobs, queue_blob_refresh
+from .tasks import run_in_background, normalize_application_images, refresh_user_avatar
+
+
+@receiver([post_save, post_delete], sender=Language)
+@receiver([post_save, post_delete], sender=CourseLevel)
+def invalidate_catalog(sender, **kwargs):
+    """Bump the catalog version once the change is committed"""
+    # Bumping before commit would let another worker reload stale rows
+    # under the new version and keep them until the next edit.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=CourseLevel)
+def refresh_language_summary(sender, instance, **kwargs):
+    """Recompute the parent language's price summary after a level changes"""
+    Language.refresh_price_summary(instance.language_id)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def invalidate_enrollment_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard([instance.user_id], ENROLLMENTS)
+
+
+@receiver([post_save, post_delete], sender=EnrollmentApplication)
+def invalidate_application_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard([instance.user_id], APPLICATIONS)
+
+
+@receiver(post_save, sender=EnrollmentApplication)
+def process_application_images(sender, instance, update_fields=None, **kwargs):
+    """Normalize new photos/signatures in the background; the photo becomes the user's avatar"""
+    if update_fields is not None and not set(update_fields) & set(instance.NORMALIZED_IMAGE_FIELDS):
+        return
+    if instance.images_pending_normalization():
+        # Refreshes the avatar once the normalized photo is in place
+        run_in_background(normalize_application_images, instance.pk)
+    elif instance.photo and not get_user_model().objects.filter(
+        pk=instance.user_id, avatar=instance.photo.name
+    ).exists():
+        run_in_background(refresh_user_avatar, instance.user_id)
+
+
+@receiver(post_delete, sender=EnrollmentApplication)
+def update_avatar_on_delete(sender, instance, **kwargs):
+    """Fall back to an older photo when the application behind the avatar goes away"""
+    if instance.photo and get_user_model().objects.filter(
+        pk=instance.user_id, avatar=instance.photo.name
+    ).exists():
+        run_in_background(refresh_user_avatar, instance.user_id)
+
+
+@receiver(post_save, sender=EnrollmentApplication)
+def claim_application_documents(sender, instance, created=False, update_fields=None, **kwargs):
+    """Count newly saved documents as references to their stored blobs"""
+    field_names = instance.DOCUMENT_FIELDS
+    if update_fields is not None:
+        field_names = set(field_names) & set(update_fields)
+    names = [getattr(instance, field_name).name for field_name in field_names if getattr(instance, field_name)]
+    if created or update_fields is not None:
+        # The documents were just set: recount exactly
+        queue_blob_refresh(names)
+    elif names:
+        # A full save of an existing row usually leaves the files alone;
+        # only make sure they aren't left counted as unused
+        transaction.on_commit(lambda: claim_blobs(names))
+
+
+@receiver(post_delete, sender=EnrollmentApplication)
+def release_application_documents(sender, instance, **kwargs):
+    """Recount the application's blobs; gc_stored_blobs removes the unused ones"""
+    queue_blob_refresh([getattr(instance, field_name).name for field_name in instance.DOCUMENT_FIELDS if getattr(instance, field_name)])
+
+
+def _enrollment_user_ids(enrollment_ids):
+    return list(Enrollment.objects.filter(pk__in=enrollment_ids).values_list('user_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Certificate)
+def invalidate_certificate_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard(_enrollment_user_ids([instance.enrollment_id]), CERTIFICATES)
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invalidate_invoice_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard(_enrollment_user_ids([instance.enrollment_id]), INVOICES)
+
+
+@receiver([post_save, pre_delete], sender=ClassSchedule)
+def invalidate_schedule_dashboards(sender, instance, **kwargs):
+    """Schedules are shared, so refresh every enrolled student's dashboard"""
+    # pre_delete: afterwards the enrollments no longer point at the schedule
+    user_ids = Enrollment.objects.filter(class_schedule=instance).values_list('user_id', flat=True)
+    invalidate_dashboard(list(user_ids), ENROLLMENTS)
@@ -0,0 +1,230 @@
+"""
+Content-addressed storage for enrollment documents.
+
+Students applying for several languages upload the same photo, ID and
+signature again for every application. The document fields therefore use
+DeduplicatedStorage: a saved file is hashed (SHA-256) and, when a blob with
+the same content exists, the field simply points at that blob instead of
+storing another copy. New content is written once, under
+<upload_to>/<2 hex chars>/<sha256><ext>.
+
+Blobs are tracked by StoredBlob, whose ref_count is the number of field
+values naming the blob (BLOB_REFERENCES, including User.avatar, which
+reuses the latest application photo). Counts are recomputed from those
+fields rather than incremented, so queryset.update() paths can't make them
+drift for long: saves and deletes recount the names they touch, and
+gc_stored_blobs recounts everything before deleting blobs that have had no
+references for a grace period.
+
+Deleting a blob through the storage only recounts it; the bytes are
+removed by gc_stored_blobs, never while another application may use them.
+"""
+import hashlib
+import os
+import re
+
+from django.apps import apps
+from django.core.files.storage import Storage, default_storage
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+# (model, field) pairs whose values may name a stored blob
+BLOB_REFERENCES = (
+    ('courses.EnrollmentApplication', 'photo'),
+    ('courses.EnrollmentApplication', 'verification_document'),
+    ('courses.EnrollmentApplication', 'signature'),
+    ('accounts.User', 'avatar'),
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+BLOB_STEM = re.compile(r'[0-9a-f]{64}')
+
+
+def _blob_model():
+    return apps.get_model('courses', 'StoredBlob')
+
+
+def hash_file(file):
+    """SHA-256 hex digest and size of a file, read in chunks from the start"""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    chunks = file.chunks(HASH_CHUNK_SIZE) if hasattr(file, 'chunks') else iter(lambda: file.read(HASH_CHUNK_SIZE), b'')
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(name, digest):
+    """<directory>/<2 hex chars>/<digest><ext> for a file saved as name"""
+    directory, basename = os.path.split(name)
+    stem, extension = os.path.splitext(basename)
+    parent, shard = os.path.split(directory)
+    if BLOB_STEM.fullmatch(stem) and shard == stem[:2]:
+        # Derived from a blob (e.g. a normalized photo): stay in the upload_to directory
+        directory = parent
+    return f'{directory}/{digest[:2]}/{digest}{extension.lower()}'
+
+
+@deconstructible
+class DeduplicatedStorage(Storage):
+    """Stores each distinct file content once on top of default_storage"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or default_storage
+
+    def get_available_name(self, name, max_length=None):
+        # _save picks the final name from the content
+        return name
+
+    def _save(self, name, content):
+        digest, size = hash_file(content)
+        StoredBlob = _blob_model()
+        blob = StoredBlob.objects.filter(sha256=digest).only('id', 'name').first()
+        # Clearing orphaned_at keeps gc_stored_blobs off the blob; if the
+        # collector deleted the row first, nothing is updated and we store anew
+        if blob and StoredBlob.objects.filter(pk=blob.pk).update(orphaned_at=None):
+            return blob.name
+
+        # backend.save() adds a suffix if a collected blob's file is still being removed
+        saved_name = self.backend.save(blob_name(name, digest), content)
+        blob, created = StoredBlob.objects.get_or_create(
+            sha256=digest,
+            defaults={'name': saved_name, 'size': size, 'orphaned_at': timezone.now()},
+        )
+        if not created:
+            # Another request stored the same content at the same time
+            self.backend.delete(saved_name)
+        return blob.name
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def delete(self, name):
+        """Recount a blob (gc_stored_blobs removes it once unused); delete other files outright"""
+        if name and _blob_model().objects.filter(name=name).exists():
+            queue_blob_refresh([name])
+        elif name:
+            self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+_document_storage = DeduplicatedStorage()
+
+
+def get_document_storage():
+    """Storage for the enrollment application document fields"""
+    return _document_storage
+
+
+def count_blob_references(names=None):
+    """{name: number of BLOB_REFERENCES values naming it}, for names or every referenced name"""
+    counts = {}
+    for label, field_name in BLOB_REFERENCES:
+        queryset = apps.get_model(label).objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        if names is not None:
+            queryset = queryset.filter(**{f'{field_name}__in': names})
+        # order_by() drops Meta.ordering, which would split the GROUP BY
+        for row in queryset.values(field_name).annotate(references=Count('pk')).order_by():
+            counts[row[field_name]] = counts.get(row[field_name], 0) + row['references']
+    return counts
+
+
+def recount_blobs(blobs, counts):
+    """Store counts on blobs; blobs dropping to zero are stamped orphaned. Returns the changed blobs"""
+    now = timezone.now()
+    changed = []
+    for blob in blobs:
+        ref_count = counts.get(blob.name, 0)
+        orphaned_at = (blob.orphaned_at or now) if ref_count == 0 else None
+        if (ref_count, orphaned_at) != (blob.ref_count, blob.orphaned_at):
+            blob.ref_count, blob.orphaned_at = ref_count, orphaned_at
+            changed.append(blob)
+    _blob_model().objects.bulk_update(changed, ['ref_count', 'orphaned_at'])
+    return changed
+
+
+def refresh_blob_references(names):
+    """Recount the blobs stored under names; names that aren't blobs are ignored"""
+    names = {name for name in names if name}
+    if not names:
+        return
+    blobs = list(_blob_model().objects.filter(name__in=names))
+    if blobs:
+        recount_blobs(blobs, count_blob_references([blob.name for blob in blobs]))
+
+
+def queue_blob_refresh(names):
+    """Recount the blobs stored under names once the current transaction commits"""
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: refresh_blob_references(names))
+
+
+def claim_blobs(names):
+    """Recount names saved into a field, if their blobs are counted as unused.
+
+    Cheaper than refresh_blob_references for saves that probably didn't
+    change the files: one query when the blobs are already referenced. A
+    count left too low but above zero is corrected by gc_stored_blobs.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return
+    unclaimed = _blob_model().objects.filter(name__in=names).filter(Q(ref_count=0) | Q(orphaned_at__isnull=False))
+    if unclaimed.exists():
+        refresh_blob_references(names)
+
+
+def adopt_file(name):
+    """Bring a file saved outside DeduplicatedStorage under it.
+
+    A file whose content is already stored is replaced by that blob in
+    every BLOB_REFERENCES field and deleted; otherwise it is registered as
+    a blob under its current name. Returns the blob name.
+    """
+    StoredBlob = _blob_model()
+    if StoredBlob.objects.filter(name=name).exists():
+        return name
+    with default_storage.open(name, 'rb') as file:
+        digest, size = hash_file(file)
+    blob = StoredBlob.objects.filter(sha256=digest).only('id', 'name').first()
+    if blob is None or not StoredBlob.objects.filter(pk=blob.pk).update(orphaned_at=None):
+        blob, _ = StoredBlob.objects.get_or_create(
+            sha256=digest,
+            defaults={'name': name, 'size': size, 'orphaned_at': timezone.now()},
+        )
+    if blob.name != name:
+        now = timezone.now()
+        for label, field_name in BLOB_REFERENCES:
+            model = apps.get_model(label)
+            changes = {field_name: blob.name}
+            if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+                changes['updated_at'] = now
+            model.objects.filter(**{field_name: name}).update(**changes)
+        default_storage.delete(name)
+    refresh_blob_references([blob.name])
+    return blob.name
@@ -0,0 +1,145 @@
+"""
+Background work that should not hold up a request.
+
+There is no task queue in this deployment, so tasks run in a daemon thread
+started after the current transaction commits. Each task must be safe to
+re-run (management commands re-run them for existing rows).
+"""
+import sys
+import threading
+import traceback
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .dashboard_cache import APPLICATIONS, invalidate_dashboard
+from .images import NORMALIZED_IMAGE_SIDES, build_derivatives, build_square_thumbnails, delete_derivatives, normalize_upload
+from .models import Language, EnrollmentApplication
+from .storage import adopt_file, refresh_blob_references
+
+
+def _run_task(func, args):
+    try:
+        func(*args)
+    except Exception as e:
+        print(f"Background task {func.__name__} failed: {str(e)}", file=sys.stderr)
+        traceback.print_exc()
+    finally:
+        # The thread opened its own connection; don't leave it to time out
+        connection.close()
+
+
+def run_in_background(func, *args):
+    """Run func(*args) in a daemon thread once the current transaction commits"""
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_task, args=(func, args), daemon=True).start()
+    )
+
+
+def generate_language_image_variants(language_id):
+    """Build srcset derivatives for a language's uploaded image"""
+    language = Language.objects.filter(pk=language_id).first()
+    if language is None:
+        return
+
+    old_variants = language.image_variants
+    variants = {}
+    if language.image_file:
+        variants = build_derivatives(language.image_file, f'languages/derived/{language.id}')
+
+    # update() keeps this from re-triggering save signals; move updated_at and
+    # the catalog version by hand so cached payloads pick up the new URLs
+    Language.objects.filter(pk=language_id).update(image_variants=variants, updated_at=timezone.now())
+    bump_catalog_version()
+    delete_derivatives(old_variants, keep=variants)
+
+
+def refresh_user_avatar(user_id, force=False):
+    """Point the user's avatar at their latest application photo and thumbnail it"""
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).only('id', 'avatar', 'avatar_thumbnails').first()
+    if user is None:
+        return
+
+    application = (
+        EnrollmentApplication.objects.filter(user_id=user_id)
+        .exclude(photo='').exclude(photo__isnull=True)
+        .order_by('-created_at').only('id', 'photo').first()
+    )
+    photo_name = application.photo.name if application else ''
+    current_name = user.avatar.name if user.avatar else ''
+    if not force and photo_name == current_name and (user.avatar_thumbnails or not photo_name):
+        return
+
+    thumbnails = {}
+    if application:
+        thumbnails = {'jpeg': build_square_thumbnails(application.photo, f'avatars/{user_id}', User.AVATAR_SIZES)}
+    User.objects.filter(pk=user_id).update(avatar=photo_name or None, avatar_thumbnails=thumbnails)
+    delete_derivatives(user.avatar_thumbnails, keep=thumbnails)
+    # The avatar holds a reference to the photo's stored blob
+    refresh_blob_references([current_name, photo_name])
+
+
+def normalize_application_images(application_id):
+    """Re-encode an application's photo and signature, keep thumbnails, then refresh the avatar"""
+    application = (
+        EnrollmentApplication.objects.filter(pk=application_id)
+        .only('id', 'user_id', 'photo', 'signature', 'image_thumbnails').first()
+    )
+    if application is None:
+        return
+
+    thumbnails = dict(application.image_thumbnails)
+    changes = {}
+    originals = {}
+    for field_name in application.images_pending_normalization():
+        field_file = getattr(application, field_name)
+        try:
+            name, thumbnail = normalize_upload(field_file, NORMALIZED_IMAGE_SIDES[field_name])
+        except OSError as e:
+            # Not a readable image: keep the upload as is and don't retry it
+            print(f"Could not normalize {field_file.name}: {str(e)}", file=sys.stderr)
+            name, thumbnail = field_file.name, ''
+        else:
+            changes[field_name] = name
+            originals[field_name] = field_file.name
+        old_thumbnail = thumbnails.get(field_name, {}).get('thumbnail')
+        thumbnails[field_name] = {'name': name, 'thumbnail': thumbnail}
+        if old_thumbnail:
+            originals[f'{field_name}_thumbnail'] = old_thumbnail
+
+    # Only swap files the application still points at; a newer upload wins
+    updated = EnrollmentApplication.objects.filter(
+        pk=application_id,
+        **{field_name: originals[field_name] for field_name in changes},
+    ).update(image_thumbnails=thumbnails, updated_at=timezone.now(), **changes)
+    if updated:
+        stale_files = [originals[field_name] for field_name in changes]
+        stale_thumbnails = [name for key, name in originals.items() if key not in changes]
+    else:
+        stale_files = list(changes.values())
+        stale_thumbnails = [
+            entry['thumbnail'] for field_name, entry in thumbnails.items()
+            if field_name in changes and entry['thumbnail']
+        ]
+    # Documents are shared blobs: the field storage only recounts them
+    document_storage = EnrollmentApplication._meta.get_field('photo').storage
+    for name in stale_files:
+        document_storage.delete(name)
+    for name in stale_thumbnails:
+        default_storage.delete(name)
+    refresh_blob_references(changes.values())
+
+    if updated:
+        invalidate_dashboard([application.user_id], APPLICATIONS)
+        if 'photo' in changes:
+            refresh_user_avatar(application.user_id)
+
+
+def adopt_application_files(names):
+    """Deduplicate files that were stored without hashing (direct uploads)"""
+    for name in names:
+        adopt_file(name)
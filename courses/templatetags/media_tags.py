@@ -0,0 +1,48 @@
+"""
+Template helpers for static video assets.
+
+build_video_assets writes a poster frame and a lighter rendition next to
+each source video. These tags pick them up when they exist, so templates
+keep working on deployments where the build step was skipped.
+"""
+import os
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+
+register = template.Library()
+
+
+POSTER_SUFFIX = '.poster.jpg'
+LITE_SUFFIX = '.lite.mp4'
+
+
+def video_asset_names(name):
+    """Return (poster, lite rendition) static names for a source video"""
+    stem = os.path.splitext(name)[0]
+    return stem + POSTER_SUFFIX, stem + LITE_SUFFIX
+
+
+@lru_cache(maxsize=None)
+def _static_exists(name):
+    # Static files don't change while the process runs, so check once
+    try:
+        if staticfiles_storage.exists(name):
+            return True
+    except Exception:
+        pass
+    return finders.find(name) is not None
+
+
+@register.simple_tag
+def video_assets(name):
+    """URLs for a static video: {'src', 'poster', 'lite'} (missing ones are None)"""
+    poster, lite = video_asset_names(name)
+    return {
+        'src': static(name),
+        'poster': static(poster) if _static_exists(poster) else None,
+        'lite': static(lite) if _static_exists(lite) else None,
+    }
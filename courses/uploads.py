@@ -0,0 +1,429 @@
+"""
+Direct-to-storage, resumable uploads for enrollment documents.
+
+Instead of posting multi-megabyte files through a sync worker (which then
+re-uploads them to S3), the browser asks for an upload session, sends the
+file in chunks straight to storage and the form submits only the session
+token. Two backends:
+
+- s3: an S3 multipart upload. The browser PUTs each part to a presigned
+  URL, so no file bytes pass through Django at all. Completion lists the
+  parts on S3 and finishes the upload server-side. The bucket's CORS rules
+  must allow PUT from the site's origin.
+- local: for FileSystemStorage. The browser PUTs chunks to a signed URL
+  handled by upload_chunk, which appends them to a .part file next to the
+  final name. Each request carries one small chunk, so a slow connection
+  never holds a worker for the whole file.
+
+Either way an interrupted upload resumes from the last stored chunk.
+
+Files that are still posted with the form go through ValidatingUploadHandler,
+which applies the same UPLOAD_RULES while the request body streams in.
+"""
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import DirectUpload, EnrollmentApplication
+from .tasks import adopt_application_files, run_in_background
+
+
+# Per-field limits for enrollment documents
+UPLOAD_RULES = {
+    'photo': {'max_size': 10 * 1024 * 1024, 'extensions': ('.jpg', '.jpeg', '.png')},
+    'verification_document': {'max_size': 20 * 1024 * 1024, 'extensions': ('.pdf', '.jpg', '.jpeg', '.png', '.doc', '.docx')},
+    'signature': {'max_size': 5 * 1024 * 1024, 'extensions': ('.jpg', '.jpeg', '.png')},
+}
+
+# Leading bytes of each accepted file type
+FILE_SIGNATURES = {
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'pdf': (b'%PDF-',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),  # OLE2 compound file
+    'docx': (b'PK\x03\x04',),  # zip container
+}
+EXTENSION_TYPES = {
+    '.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.pdf': 'pdf', '.doc': 'doc', '.docx': 'docx',
+}
+SNIFF_BYTES = max(len(signature) for signatures in FILE_SIGNATURES.values() for signature in signatures)
+
+# Largest multipart body the enrollment form accepts: every file at its cap plus the text fields
+MAX_FORM_SIZE = sum(rules['max_size'] for rules in UPLOAD_RULES.values()) + 1024 * 1024
+
+# S3 parts must be at least 5 MiB (except the last); local chunks stay small
+S3_PART_SIZE = 5 * 1024 * 1024
+LOCAL_CHUNK_SIZE = 1024 * 1024
+
+PRESIGNED_URL_TTL = 60 * 60
+CHUNK_SIGNATURE_SALT = 'courses.uploads.chunk'
+
+
+class UploadError(Exception):
+    """An upload request that can't be honoured; the message is shown to the user"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def direct_uploads_backend():
+    """'s3', 'local', or None when direct uploads are unavailable"""
+    if not getattr(settings, 'DIRECT_UPLOADS', True):
+        return None
+    if isinstance(default_storage, FileSystemStorage):
+        return 'local'
+    if hasattr(default_storage, 'bucket_name') and hasattr(default_storage, 'connection'):
+        return 's3'
+    return None
+
+
+def _s3_client():
+    return default_storage.connection.meta.client
+
+
+def _s3_key(name):
+    # The storage adds its location prefix to names; use the same object key
+    return default_storage._normalize_name(name)
+
+
+def _part_path(upload):
+    return default_storage.path(upload.key) + '.part'
+
+
+def validate_filename(field_name, filename):
+    rules = UPLOAD_RULES.get(field_name)
+    if rules is None:
+        raise UploadError('Unknown upload field')
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in rules['extensions']:
+        raise UploadError(f'{filename}: file type not allowed')
+    return rules
+
+
+def validate_upload(field_name, filename, size):
+    rules = validate_filename(field_name, filename)
+    if size <= 0:
+        raise UploadError(f'{filename}: file is empty')
+    if size > rules['max_size']:
+        raise UploadError(f'{filename}: file is larger than {rules["max_size"] // (1024 * 1024)} MB')
+
+
+def sniff_file_type(head):
+    """The FILE_SIGNATURES type that the first bytes of a file match, or None"""
+    for file_type, signatures in FILE_SIGNATURES.items():
+        if any(head.startswith(signature) for signature in signatures):
+            return file_type
+    return None
+
+
+def check_file_head(field_name, filename, head):
+    """Reject a file whose leading bytes aren't one of the field's allowed types"""
+    allowed = {EXTENSION_TYPES[extension] for extension in UPLOAD_RULES[field_name]['extensions']}
+    if sniff_file_type(head) not in allowed:
+        raise UploadError(f"{filename}: file contents don't match an allowed file type")
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """Apply UPLOAD_RULES to multipart files while they stream in.
+
+    Unknown fields, disallowed extensions, contents whose magic bytes don't
+    match and files over their size cap stop the upload at the offending
+    chunk: nothing more is stored or parsed, and the rest of the body (at
+    most MAX_FORM_SIZE) is drained unparsed so the browser gets the error
+    page rather than a reset connection. The reason is left in
+    request.upload_errors, keyed by field name.
+
+    Must be first in request.upload_handlers, which have to be set before
+    anything reads request.POST (so before the CSRF check). Fields after
+    the refused file are lost, so forms must put the CSRF token first.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.errors = {}
+        if request is not None:
+            request.upload_errors = self.errors
+
+    def _reject(self, error):
+        self.errors[self.field_name] = str(error)
+        raise StopUpload(connection_reset=False)
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.head = b''
+        self.received = 0
+        try:
+            self.max_size = validate_filename(field_name, file_name)['max_size']
+        except UploadError as e:
+            self._reject(e)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._reject(f'{self.file_name}: file is larger than {self.max_size // (1024 * 1024)} MB')
+        if len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) == SNIFF_BYTES:
+                self._check_head()
+        return raw_data
+
+    def file_complete(self, file_size):
+        if len(self.head) < SNIFF_BYTES:
+            # Files shorter than SNIFF_BYTES
+            self._check_head()
+        # Let the default handlers build the file
+        return None
+
+    def _check_head(self):
+        try:
+            check_file_head(self.field_name, self.file_name, self.head)
+        except UploadError as e:
+            self._reject(e)
+
+
+def start_upload(user, field_name, filename, size, content_type=''):
+    """Create an upload session and return it"""
+    backend = direct_uploads_backend()
+    if backend is None:
+        raise UploadError('Direct uploads are not available', status=404)
+    validate_upload(field_name, filename, size)
+
+    token = uuid.uuid4()
+    upload_to = EnrollmentApplication._meta.get_field(field_name).upload_to
+    key = f'{upload_to.rstrip("/")}/{token.hex[:12]}-{get_valid_filename(os.path.basename(filename))}'
+    upload = DirectUpload(
+        token=token,
+        user=user,
+        field_name=field_name,
+        filename=filename[:255],
+        content_type=content_type[:100],
+        size=size,
+        key=key,
+        backend=backend,
+    )
+    if backend == 's3':
+        params = {'Bucket': default_storage.bucket_name, 'Key': _s3_key(key)}
+        if content_type:
+            params['ContentType'] = content_type
+        upload.s3_upload_id = _s3_client().create_multipart_upload(**params)['UploadId']
+    else:
+        os.makedirs(os.path.dirname(default_storage.path(key)), exist_ok=True)
+        open(_part_path(upload), 'wb').close()
+    upload.save()
+    return upload
+
+
+def _uploaded_parts(upload):
+    """{part number: part dict} already stored on S3"""
+    parts = {}
+    kwargs = {
+        'Bucket': default_storage.bucket_name,
+        'Key': _s3_key(upload.key),
+        'UploadId': upload.s3_upload_id,
+    }
+    while True:
+        page = _s3_client().list_parts(**kwargs)
+        for part in page.get('Parts', []):
+            parts[part['PartNumber']] = part
+        if not page.get('IsTruncated'):
+            return parts
+        kwargs['PartNumberMarker'] = page['NextPartNumberMarker']
+
+
+def upload_status(upload, request):
+    """What the browser needs to (re)start sending chunks"""
+    data = {
+        'token': str(upload.token),
+        'backend': upload.backend,
+        'size': upload.size,
+        'completed': upload.completed_at is not None,
+    }
+    if data['completed']:
+        return data
+
+    if upload.backend == 's3':
+        part_count = max(1, -(-upload.size // S3_PART_SIZE))
+        done = _uploaded_parts(upload)
+        client = _s3_client()
+        data['chunk_size'] = S3_PART_SIZE
+        data['done_parts'] = sorted(done)
+        data['part_urls'] = {
+            str(number): client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': default_storage.bucket_name,
+                    'Key': _s3_key(upload.key),
+                    'UploadId': upload.s3_upload_id,
+                    'PartNumber': number,
+                },
+                ExpiresIn=PRESIGNED_URL_TTL,
+            )
+            for number in range(1, part_count + 1) if number not in done
+        }
+    else:
+        signature = signing.TimestampSigner(salt=CHUNK_SIGNATURE_SALT).sign(str(upload.token))
+        data['chunk_size'] = LOCAL_CHUNK_SIZE
+        data['offset'] = upload.received
+        data['chunk_url'] = request.build_absolute_uri(
+            reverse('upload-chunk', args=[upload.token]) + f'?signature={signature}'
+        )
+    return data
+
+
+def check_chunk_signature(token, signature):
+    try:
+        value = signing.TimestampSigner(salt=CHUNK_SIGNATURE_SALT).unsign(signature, max_age=PRESIGNED_URL_TTL)
+    except signing.BadSignature:
+        return False
+    return value == str(token)
+
+
+def write_chunk(upload, offset, stream, length):
+    """Write a chunk at offset into the local .part file; return the new offset"""
+    if upload.completed_at is not None:
+        raise UploadError('Upload already completed', status=409)
+    if offset > upload.received:
+        # A chunk went missing; the browser resumes from upload.received
+        raise UploadError('Chunk out of order', status=409)
+    if offset + length > upload.size:
+        raise UploadError('Chunk is past the end of the file')
+
+    with open(_part_path(upload), 'r+b') as part:
+        part.seek(offset)
+        remaining = length
+        while remaining > 0:
+            data = stream.read(min(remaining, 64 * 1024))
+            if not data:
+                break
+            if offset == 0 and remaining == length:
+                check_file_head(upload.field_name, upload.filename, data[:SNIFF_BYTES])
+            part.write(data)
+            remaining -= len(data)
+    if remaining:
+        raise UploadError('Chunk was cut short')
+
+    received = offset + length
+    DirectUpload.objects.filter(pk=upload.pk, received__lt=received).update(received=received)
+    return max(received, upload.received)
+
+
+def complete_upload(upload):
+    """Finish the upload once every byte is stored"""
+    if upload.completed_at is not None:
+        return upload
+
+    if upload.backend == 's3':
+        parts = _uploaded_parts(upload)
+        if sum(part['Size'] for part in parts.values()) != upload.size:
+            raise UploadError('Upload is incomplete', status=409)
+        _s3_client().complete_multipart_upload(
+            Bucket=default_storage.bucket_name,
+            Key=_s3_key(upload.key),
+            UploadId=upload.s3_upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': parts[number]['ETag']} for number in sorted(parts)
+            ]},
+        )
+        # Parts went straight to S3, so this is the first look at the contents
+        head = _s3_client().get_object(
+            Bucket=default_storage.bucket_name,
+            Key=_s3_key(upload.key),
+            Range=f'bytes=0-{SNIFF_BYTES - 1}',
+        )['Body'].read()
+        try:
+            check_file_head(upload.field_name, upload.filename, head)
+        except UploadError:
+            default_storage.delete(upload.key)
+            upload.delete()
+            raise
+    else:
+        part_path = _part_path(upload)
+        if upload.received != upload.size or os.path.getsize(part_path) != upload.size:
+            raise UploadError('Upload is incomplete', status=409)
+        os.replace(part_path, default_storage.path(upload.key))
+
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['completed_at'])
+    return upload
+
+
+def claim_upload(user, field_name, token):
+    """Storage name of a finished, unused upload of field_name by user, or None"""
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        return None
+    upload = DirectUpload.objects.filter(
+        token=token,
+        user=user,
+        field_name=field_name,
+        completed_at__isnull=False,
+        consumed_at__isnull=True,
+    ).first()
+    return upload.key if upload else None
+
+
+def mark_consumed(user, tokens):
+    """Mark uploads as attached to an application so cleanup keeps their files"""
+    tokens = [token for token in tokens if token]
+    if tokens:
+        DirectUpload.objects.filter(user=user, token__in=tokens).update(consumed_at=timezone.now())
+
+
+def attach_direct_uploads(user, application, data):
+    """Attach the finished direct uploads named by <field>_upload tokens in data.
+
+    Returns {field name: error} for tokens that can't be used. A token that
+    was already attached is ignored while the application still has a file
+    for that field (the form may send it again on submit).
+    """
+    claimed = {}
+    errors = {}
+    for field_name in UPLOAD_RULES:
+        token = data.get(f'{field_name}_upload')
+        if not token:
+            continue
+        name = claim_upload(user, field_name, token)
+        if name is not None:
+            claimed[field_name] = (name, token)
+        elif not getattr(application, field_name):
+            errors[field_name] = 'Upload not found or not finished'
+    if claimed:
+        for field_name, (name, token) in claimed.items():
+            setattr(application, field_name, name)
+        application.save(update_fields=[*claimed, 'updated_at'])
+        mark_consumed(user, [token for name, token in claimed.values()])
+        # Images are deduplicated when they are normalized; hash the rest now
+        unhashed = [
+            name for field_name, (name, token) in claimed.items()
+            if field_name not in EnrollmentApplication.NORMALIZED_IMAGE_FIELDS
+        ]
+        if unhashed:
+            run_in_background(adopt_application_files, unhashed)
+    return errors
+
+
+def discard_upload(upload):
+    """Remove an unused upload's stored bytes and its session"""
+    if upload.completed_at is not None:
+        default_storage.delete(upload.key)
+    elif upload.backend == 's3':
+        _s3_client().abort_multipart_upload(
+            Bucket=default_storage.bucket_name,
+            Key=_s3_key(upload.key),
+            UploadId=upload.s3_upload_id,
+        )
+    else:
+        try:
+            os.remove(_part_path(upload))
+        except FileNotFoundError:
+            pass
+    upload.delete()
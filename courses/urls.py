@@ -5,10 +5,17 @@ from . import admin_views
 urlpatterns = [
     path('', views.language_list, name='language-list'),
     path('<int:pk>/', views.language_detail, name='language-detail'),
+    path('search/', views.language_search, name='language-search'),
     path('<int:language_id>/levels/', views.course_levels_by_language, name='course-levels'),
     path('enroll/', views.enroll, name='enroll'),
     path('my-enrollments/', views.my_enrollments, name='my-enrollments'),
+    path('dashboard/', views.dashboard_api, name='dashboard-api'),
     path('enrollment-form/', views.enrollment_form, name='enrollment-form'),
+    path('enrollment-form/draft/', views.enrollment_draft, name='enrollment-draft'),
+    path('uploads/', views.start_direct_upload, name='start-upload'),
+    path('uploads/<uuid:token>/', views.direct_upload_status, name='upload-status'),
+    path('uploads/<uuid:token>/chunk/', views.upload_chunk, name='upload-chunk'),
+    path('uploads/<uuid:token>/complete/', views.complete_direct_upload, name='complete-upload'),
     path('payment/', views.payment_portal, name='payment-portal'),
     path('payment/create-order/', views.create_payment_order, name='create-payment-order'),
     path('payment/webhook/', views.payment_webhook, name='payment-webhook'),
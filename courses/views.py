@@ -2,84 +2,143 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_http_methods, require_POST, require_safe
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
+import hashlib
 import os
-from .models import Language, CourseLevel, Enrollment, ClassSchedule, Certificate, Invoice
-from .serializers import LanguageSerializer, CourseLevelSerializer, EnrollmentSerializer
+import sys
+from .models import CourseLevel, Enrollment, EnrollmentApplication, ClassSchedule, Certificate, Invoice, DirectUpload
+from .serializers import (
+    LanguageSerializer, CourseLevelSerializer, EnrollmentSerializer,
+    DashboardEnrollmentSerializer, DashboardApplicationSerializer, DashboardCertificateSerializer,
+    DashboardInvoiceSerializer, DashboardScheduleSerializer, EnrollmentDraftSerializer,
+)
+from .catalog import get_catalog, catalog_conditional, catalog_json_response
+from .page_cache import serve_cached_page
+from .pagination import CatalogPagination, DashboardCursorPagination
+from .dashboard_cache import get_section_keys, lazy_dashboard_context
+from .drafts import get_draft, get_or_create_draft
+from .uploads import (
+    MAX_FORM_SIZE, UploadError, ValidatingUploadHandler, attach_direct_uploads, check_chunk_signature,
+    complete_upload, direct_uploads_backend, start_upload, upload_status, write_chunk,
+)
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
+def _json_response(data):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json')
+
+
+@catalog_conditional
+@require_safe
 def language_list(request):
-    """Get all languages"""
-    languages = Language.objects.all()
-    serializer = LanguageSerializer(languages, many=True)
-    return Response(serializer.data)
+    """Get all languages.
+    
+    Supports ?fields=id,name,... and ?expand=levels for sparse payloads and
+    ?limit=&offset= for paging. Unpaged responses are pre-rendered once per
+    catalog version.
+    """
+    try:
+        fields, expand = LanguageSerializer.parse_fieldset(request.GET)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+    paginator = CatalogPagination()
+    page = paginator.paginate_list(get_catalog().languages, request)
+    if page is None:
+        return catalog_json_response(
+            request,
+            f"language-list:{','.join(fields) if fields is not None else '*'}:{','.join(expand)}",
+            lambda catalog: LanguageSerializer(catalog.languages, many=True, fields=fields, expand=expand).data
+        )
+    
+    serializer = LanguageSerializer(page, many=True, fields=fields, expand=expand)
+    return _json_response(paginator.get_paginated_data(serializer.data))
 
 
-def languages_page(request):
-    """Render the languages page with database data"""
-    languages = Language.objects.prefetch_related('levels').all().order_by('category', 'name')
-    
-    # Calculate price ranges for each language
-    languages_with_prices = []
-    for lang in languages:
-        levels = lang.levels.all()
-        if levels.exists():
-            prices = [float(level.price) for level in levels]
-            min_price = min(prices)
-            max_price = max(prices)
-            price_range = f"₹{int(min_price/1000)}K - ₹{int(max_price/1000)}K"
-        else:
-            price_range = "Price TBD"
-        
-        languages_with_prices.append({
+@catalog_conditional
+@require_safe
+def language_search(request):
+    """Type-ahead search over language names and aliases (?q=man -> Chinese via "Mandarin")"""
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    languages = get_catalog().search(request.GET.get('q', ''), limit=limit)
+    serializer = LanguageSerializer(languages, many=True, fields=('id', 'name', 'flag_emoji', 'aliases'))
+    return _json_response(serializer.data)
+
+
+def languages_page_context():
+    """Build the languages page context from the catalog snapshot"""
+    languages = get_catalog().languages_by_category
+    
+    # Price ranges are kept up to date on the Language rows
+    languages_with_prices = [
+        {
             'language': lang,
-            'price_range': price_range,
-            'levels_count': levels.count()
-        })
+            'price_range': lang.price_range,
+            'levels_count': lang.levels_count,
+        }
+        for lang in languages
+    ]
     
-    context = {
+    return {
         'languages_data': languages_with_prices,
         'languages': languages,  # Keep for backward compatibility
     }
-    
-    return render(request, 'languages.html', context)
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
+def languages_page(request):
+    """Render the languages page, served from the full-page cache"""
+    return serve_cached_page(request, 'languages.html', languages_page_context)
+
+
+@catalog_conditional
+@require_safe
 def language_detail(request, pk):
     """Get language details with course levels"""
-    try:
-        language = Language.objects.get(pk=pk)
-        serializer = LanguageSerializer(language)
-        return Response(serializer.data)
-    except Language.DoesNotExist:
-        return Response(
-            {'error': 'Language not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+    language = get_catalog().get_language(pk)
+    if language is None:
+        return JsonResponse({'error': 'Language not found'}, status=404)
+    return catalog_json_response(
+        request,
+        f'language-detail:{language.id}',
+        lambda catalog: LanguageSerializer(language).data
+    )
 
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
+@catalog_conditional
+@require_safe
 def course_levels_by_language(request, language_id):
-    """Get all course levels for a specific language"""
+    """Get all course levels for a specific language (supports ?fields= and ?limit=&offset=)"""
+    catalog = get_catalog()
+    language = catalog.get_language(language_id)
+    if language is None:
+        return JsonResponse({'error': 'Language not found'}, status=404)
+    
     try:
-        language = Language.objects.get(pk=language_id)
-        levels = CourseLevel.objects.filter(language=language)
-        serializer = CourseLevelSerializer(levels, many=True)
-        return Response(serializer.data)
-    except Language.DoesNotExist:
-        return Response(
-            {'error': 'Language not found'},
-            status=status.HTTP_404_NOT_FOUND
+        fields, _ = CourseLevelSerializer.parse_fieldset(request.GET)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400)
+    paginator = CatalogPagination()
+    page = paginator.paginate_list(catalog.get_levels(language), request)
+    if page is None:
+        return catalog_json_response(
+            request,
+            f"course-levels:{language.id}:{','.join(fields) if fields is not None else '*'}",
+            lambda catalog: CourseLevelSerializer(catalog.get_levels(language), many=True, fields=fields).data
         )
+    
+    serializer = CourseLevelSerializer(page, many=True, fields=fields)
+    return _json_response(paginator.get_paginated_data(serializer.data))
 
 
 @api_view(['POST'])
@@ -136,120 +195,155 @@ def my_enrollments(request):
             status=status.HTTP_401_UNAUTHORIZED
         )
     
-    enrollments = Enrollment.objects.filter(user=request.user)
+    enrollments = EnrollmentSerializer.setup_eager_loading(
+        Enrollment.objects.filter(user=request.user)
+    )
     serializer = EnrollmentSerializer(enrollments, many=True)
     return Response(serializer.data)
 
 
-@login_required
-def dashboard(request):
-    """User dashboard view - Optimized for performance"""
-    user = request.user
-    
-    # Optimize: Single query with all related data fetched
-    enrollments_queryset = Enrollment.objects.filter(user=user).select_related(
-        'course_level__language', 'class_schedule', 'certificate'
-    ).prefetch_related('invoices')
-    
-    # Convert to list to avoid multiple queries - evaluate once
-    enrollments_list = list(enrollments_queryset)
-    
-    # Get enrollment applications for the user - optimized
-    enrollment_applications = EnrollmentApplication.objects.filter(user=user).select_related(
-        'language'
-    ).prefetch_related('levels').order_by('-created_at')[:50]  # Limit to recent 50
-    
-    # Get user's latest photo from enrollment application
-    latest_application_with_photo = EnrollmentApplication.objects.filter(
-        user=user,
-        photo__isnull=False
-    ).order_by('-created_at').first()
-    user_photo = latest_application_with_photo.photo if latest_application_with_photo else None
-    
-    # Get only approved certificates that can be downloaded - optimized
-    approved_certificates = Certificate.objects.filter(
-        enrollment__user=user,
-        status='approved',
-        certificate_file__isnull=False
-    ).select_related('enrollment__course_level__language')
-    
-    # Get invoices - optimized with select_related
-    invoices = Invoice.objects.filter(enrollment__user=user).select_related('enrollment')
-    
-    # Pre-calculate counts to avoid queryset.count() in template (which causes extra queries)
-    enrollments_count = len(enrollments_list)
-    active_enrollments_count = sum(1 for e in enrollments_list if e.status == 'active')
-    completed_enrollments_count = sum(1 for e in enrollments_list if e.status == 'completed')
-    certificates_count = approved_certificates.count()  # Single count query
-    invoices_count = invoices.count()  # Single count query
-    
-    # Organize data for template
-    dashboard_data = {
-        'user': user,
-        'enrollments': enrollments_list,
-        'active_enrollments': [e for e in enrollments_list if e.status == 'active'],
-        'completed_enrollments': [e for e in enrollments_list if e.status == 'completed'],
-        'certificates': approved_certificates,
-        'invoices': invoices,
-        'enrollment_applications': enrollment_applications,
-        'user_photo': user_photo,
-        # Pre-calculated counts
-        'enrollments_count': enrollments_count,
-        'active_enrollments_count': active_enrollments_count,
-        'completed_enrollments_count': completed_enrollments_count,
-        'certificates_count': certificates_count,
-        'invoices_count': invoices_count,
+DASHBOARD_COLLECTIONS = ('enrollments', 'applications', 'certificates', 'invoices', 'schedule')
+
+
+def _dashboard_querysets(user):
+    """Collection name -> (serializer class, the user's rows)"""
+    return {
+        'enrollments': (DashboardEnrollmentSerializer, Enrollment.objects.filter(user=user)),
+        'applications': (DashboardApplicationSerializer, EnrollmentApplication.objects.filter(user=user).exclude(status='draft')),
+        'certificates': (DashboardCertificateSerializer, Certificate.objects.filter(
+            enrollment__user=user, status='approved', certificate_file__isnull=False)),
+        'invoices': (DashboardInvoiceSerializer, Invoice.objects.filter(enrollment__user=user)),
+        'schedule': (DashboardScheduleSerializer, ClassSchedule.objects.filter(enrollments__user=user)),
     }
+
+
+def _dashboard_etag(request):
+    """Changes whenever any dashboard data for the user (or the query) changes"""
+    if not request.user.is_authenticated:
+        return None
+    section_keys = get_section_keys(request.user.pk)
+    state = '|'.join([request.GET.urlencode()] + [section_keys[name] for name in sorted(section_keys)])
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+@cache_control(private=True, no_cache=True)
+@api_view(['GET'])
+@condition(etag_func=_dashboard_etag)
+def dashboard_api(request):
+    """Everything on the student dashboard in one response.
+    
+    Each collection is cursor-paged (?<name>_cursor=, ?page_size=). With
+    ?since=<ISO timestamp> only rows changed after it are returned, along with
+    the ids of all current rows so clients can drop deleted ones; pass the
+    previous response's server_time. ?include=a,b limits the collections.
+    """
+    if not request.user.is_authenticated:
+        return Response(
+            {'error': 'Authentication required'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
     
-    return render(request, 'dashboard.html', dashboard_data)
+    # Taken before reading, so changes made during this request show up next time
+    server_time = timezone.now()
+    
+    since = None
+    if request.GET.get('since'):
+        # A literal "+" in the offset arrives as a space when not URL-encoded
+        since = parse_datetime(request.GET['since'].strip().replace(' ', '+'))
+        if since is None:
+            return Response(
+                {'error': 'Invalid since timestamp; use ISO 8601'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    
+    include = DASHBOARD_COLLECTIONS
+    if request.GET.get('include'):
+        requested = {name.strip() for name in request.GET['include'].split(',')}
+        include = tuple(name for name in DASHBOARD_COLLECTIONS if name in requested)
+    
+    data = {
+        'server_time': server_time.isoformat(),
+        'since': since.isoformat() if since else None,
+    }
+    querysets = _dashboard_querysets(request.user)
+    for name in include:
+        serializer_class, queryset = querysets[name]
+        rows = serializer_class.setup_eager_loading(queryset)
+        if since is not None:
+            rows = rows.filter(updated_at__gt=since)
+        paginator = DashboardCursorPagination(name)
+        page = paginator.paginate_queryset(rows, request)
+        data[name] = paginator.get_page_data(serializer_class(page, many=True, context={'request': request}).data)
+        if since is not None:
+            data[name]['ids'] = list(queryset.values_list('id', flat=True))
+    
+    return Response(data)
+
+
+@login_required
+def dashboard(request):
+    """User dashboard view - sections are cached per user until their data changes"""
+    return render(request, 'dashboard.html', lazy_dashboard_context(request.user))
 
 
 from django.utils import timezone
 from .models import EnrollmentApplication
 from .serializers import EnrollmentApplicationSerializer
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.conf import settings
-import razorpay
 import json
 
+from django.db import transaction
+
+from .payments import GatewayNotConfigured, GatewayUnavailable, create_order
+from .webhooks import record_event, verify_signature
+from .provisioning import provision_enrollments
+
 @login_required
+@csrf_exempt
 def enrollment_form(request):
-    """Enrollment form view - requires authentication"""
+    """Enrollment form view - requires authentication
+    
+    Posted files are validated while they stream in, so the upload handler
+    must be installed before the CSRF check reads request.POST; the check
+    itself runs on _enrollment_form.
+    """
+    if request.method == 'POST':
+        if int(request.META.get('CONTENT_LENGTH') or 0) > MAX_FORM_SIZE:
+            # Refuse without reading the body at all
+            return _enrollment_form_error(request, 'The uploaded files are too large', status=413)
+        request.upload_handlers.insert(0, ValidatingUploadHandler(request))
+    return _enrollment_form(request)
+
+
+@csrf_protect
+def _enrollment_form(request):
     if request.method == 'GET':
         # Get preselected language if provided
         language_id = request.GET.get('language_id')
         language_name = request.GET.get('language')
         
         # Get all languages for the dropdown
-        languages = Language.objects.all().prefetch_related('levels')
+        catalog = get_catalog()
+        languages = catalog.languages
         
         # If language_id provided, get the specific language
         selected_language = None
         if language_id:
-            try:
-                selected_language = Language.objects.get(id=language_id)
-            except Language.DoesNotExist:
-                pass
+            selected_language = catalog.get_language(language_id)
         elif language_name:
-            # Try exact match first, then case-insensitive
-            try:
-                selected_language = Language.objects.get(name=language_name)
-            except Language.DoesNotExist:
-                try:
-                    selected_language = Language.objects.get(name__iexact=language_name)
-                except Language.DoesNotExist:
-                    # Try partial match
-                    try:
-                        selected_language = Language.objects.filter(name__icontains=language_name).first()
-                    except:
-                        pass
+            # Normalized name/alias lookup, then prefix match
+            selected_language = catalog.find_language(language_name)
         
         context = {
             'user': request.user,
             'languages': languages,
             'selected_language': selected_language,
             'selected_language_id': language_id,
+            **_draft_context(request.user),
         }
         
         # Check if this is an AJAX request (for modal)
@@ -261,85 +355,204 @@ def enrollment_form(request):
     elif request.method == 'POST':
         # Handle form submission
         try:
-            # Get form data
-            language_id = request.POST.get('language')
-            level_ids = request.POST.getlist('levels')
-            full_name = request.POST.get('full_name')
-            date_of_birth = request.POST.get('date_of_birth')
-            phone_number = request.POST.get('phone_number')
-            email = request.POST.get('email')
-            address = request.POST.get('address')
-            schedule_type = request.POST.get('schedule_type')
-            preferred_hour = request.POST.get('preferred_hour', '')
+            # Parse the body here rather than count on the CSRF check having
+            # done it; upload_errors is only filled in while the files stream in
+            request.FILES
+            # A file was refused while streaming in; the rest of the form wasn't read
+            if request.upload_errors:
+                return _enrollment_form_error(request, ' '.join(request.upload_errors.values()), status=400)
             
-            # Get uploaded files
-            photo = request.FILES.get('photo')
-            verification_doc = request.FILES.get('verification_document')
-            signature = request.FILES.get('signature')
+            # Everything posted goes into the user's draft first, so a validation
+            # error never loses fields or files that were already sent
+            draft = get_or_create_draft(request.user)
+            data = {
+                name: value for name, value in request.POST.items()
+                if value and name in EnrollmentDraftSerializer.Meta.fields and name != 'levels'
+            }
+            if request.POST.getlist('levels'):
+                data['levels'] = request.POST.getlist('levels')
+            data.update(request.FILES.items())
+            serializer = EnrollmentDraftSerializer(draft, data=data, partial=True)
+            if not serializer.is_valid():
+                return _enrollment_form_error(request, _format_errors(serializer.errors))
+            serializer.save()
+            
+            # Files sent straight to storage arrive as upload tokens
+            upload_errors = attach_direct_uploads(request.user, draft, request.POST)
+            if upload_errors:
+                return _enrollment_form_error(request, _format_errors(upload_errors))
             
             # Validate required fields
-            if not all([language_id, level_ids, full_name, date_of_birth, phone_number, email, address, schedule_type, photo, verification_doc, signature]):
-                return render(request, 'enrollment_form.html', {
-                    'error': 'All fields are required',
-                    'languages': Language.objects.all().prefetch_related('levels'),
-                })
+            required = [
+                draft.language_id, draft.full_name, draft.date_of_birth, draft.phone_number, draft.email,
+                draft.address, draft.schedule_type, draft.photo, draft.verification_document, draft.signature,
+            ]
+            if not all(required):
+                return _enrollment_form_error(request, 'All fields are required')
             
             # Validate preferred_hour for weekday schedule
-            if schedule_type == 'weekday' and not preferred_hour:
-                return render(request, 'enrollment_form.html', {
-                    'error': 'Please select a preferred hour for weekday classes',
-                    'languages': Language.objects.all().prefetch_related('levels'),
-                })
-            
-            # Get language and levels
-            language = Language.objects.get(id=language_id)
-            levels = CourseLevel.objects.filter(id__in=level_ids, language=language)
+            if draft.schedule_type == 'weekday' and not draft.preferred_hour:
+                return _enrollment_form_error(request, 'Please select a preferred hour for weekday classes')
             
-            if not levels.exists():
-                return render(request, 'enrollment_form.html', {
-                    'error': 'Please select at least one valid level',
-                    'languages': Language.objects.all().prefetch_related('levels'),
-                })
-            
-            # Create enrollment application
-            application = EnrollmentApplication.objects.create(
-                user=request.user,
-                language=language,
-                full_name=full_name,
-                date_of_birth=date_of_birth,
-                phone_number=phone_number,
-                email=email,
-                address=address,
-                schedule_type=schedule_type,
-                preferred_hour=preferred_hour if schedule_type == 'weekday' else '',
-                photo=photo,
-                verification_document=verification_doc,
-                signature=signature,
-                status='submitted',
-                submitted_at=timezone.now()
-            )
+            # The serializer keeps levels within the draft's language
+            if not draft.levels.exists():
+                return _enrollment_form_error(request, 'Please select at least one valid level')
             
-            # Add selected levels
-            application.levels.set(levels)
-            
-            # Calculate total amount
-            total_amount = application.calculate_total_amount()
-            application.save()
+            # Submitting only flips the draft's status
+            application = draft
+            application.status = 'submitted'
+            application.submitted_at = timezone.now()
+            if application.schedule_type != 'weekday':
+                application.preferred_hour = ''
+            application.calculate_total_amount()
+            # Not the files: the photo/signature may already be getting normalized
+            application.save(update_fields=['status', 'submitted_at', 'preferred_hour', 'total_amount', 'updated_at'])
             
             # Redirect to payment portal with application details
             return redirect(reverse('payment-portal') + f'?application_id={application.id}')
             
         except Exception as e:
-            return render(request, 'enrollment_form.html', {
-                'error': f'An error occurred: {str(e)}',
-                'languages': Language.objects.all().prefetch_related('levels'),
-            })
+            return _enrollment_form_error(request, f'An error occurred: {str(e)}')
     
     return render(request, 'enrollment_form.html', {
-        'languages': Language.objects.all().prefetch_related('levels'),
+        'languages': get_catalog().languages,
     })
 
 
+def _draft_context(user):
+    """Template context for prefilling the form from the user's draft"""
+    draft = get_draft(user)
+    return {
+        'draft': EnrollmentDraftSerializer(draft).data if draft else None,
+        'direct_uploads': direct_uploads_backend() is not None,
+    }
+
+
+def _enrollment_form_error(request, error, status=200):
+    """Re-render the form with an error; the draft fills the saved values back in"""
+    return render(request, 'enrollment_form.html', {
+        'error': error,
+        'languages': get_catalog().languages,
+        **_draft_context(request.user),
+    }, status=status)
+
+
+def _format_errors(errors):
+    """One line from serializer-style {field: [messages]} errors"""
+    return ' '.join(
+        f"{field.replace('_', ' ').capitalize()}: {' '.join(map(str, messages)) if isinstance(messages, list) else messages}"
+        for field, messages in errors.items()
+    )
+
+
+@api_view(['GET', 'PATCH'])
+def enrollment_draft(request):
+    """Autosave for the enrollment form.
+    
+    GET returns the user's draft application (204 if none). PATCH saves whatever
+    fields are sent into the draft, creating it on first use: JSON for text
+    fields, levels and <field>_upload tokens from direct uploads, or
+    multipart for a single file posted through the validating upload handler.
+    """
+    if not request.user.is_authenticated:
+        return Response(
+            {'error': 'Authentication required'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    if request.method == 'GET':
+        draft = get_draft(request.user)
+        if draft is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(EnrollmentDraftSerializer(draft).data)
+    
+    # PATCH bodies aren't read by the CSRF check (DRF takes the header), so
+    # the handler can still be installed before the files are parsed
+    handler = ValidatingUploadHandler(request._request)
+    request.upload_handlers.insert(0, handler)
+    data = request.data
+    if handler.errors:
+        return Response({'errors': handler.errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    draft = get_or_create_draft(request.user)
+    serializer = EnrollmentDraftSerializer(draft, data=data, partial=True)
+    if not serializer.is_valid():
+        return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    serializer.save()
+    
+    upload_errors = attach_direct_uploads(request.user, draft, data)
+    if upload_errors:
+        return Response({'errors': upload_errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(EnrollmentDraftSerializer(draft).data)
+
+
+def _upload_error(error):
+    return JsonResponse({'error': str(error)}, status=error.status)
+
+
+@login_required
+@require_POST
+def start_direct_upload(request):
+    """Open a resumable upload session for one enrollment document"""
+    try:
+        data = json.loads(request.body)
+        size = int(data.get('size', 0))
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    try:
+        upload = start_upload(
+            request.user,
+            data.get('field', ''),
+            data.get('filename', ''),
+            size,
+            data.get('content_type', ''),
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(upload_status(upload, request), status=201)
+
+
+@login_required
+@require_GET
+def direct_upload_status(request, token):
+    """Where to resume an upload: stored offset/parts and fresh chunk URLs"""
+    upload = get_object_or_404(DirectUpload, token=token, user=request.user, consumed_at__isnull=True)
+    return JsonResponse(upload_status(upload, request))
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def upload_chunk(request, token):
+    """Store one chunk of a local upload (authorised by the signed chunk URL)"""
+    if not check_chunk_signature(token, request.GET.get('signature', '')):
+        return JsonResponse({'error': 'Invalid or expired signature'}, status=403)
+    upload = get_object_or_404(DirectUpload, token=token, backend='local')
+    try:
+        offset = int(request.GET.get('offset', 0))
+        length = int(request.headers.get('Content-Length') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid offset'}, status=400)
+    try:
+        received = write_chunk(upload, offset, request, length)
+    except UploadError as e:
+        upload.refresh_from_db(fields=['received'])
+        return JsonResponse({'error': str(e), 'offset': upload.received}, status=e.status)
+    return JsonResponse({'offset': received})
+
+
+@login_required
+@require_POST
+def complete_direct_upload(request, token):
+    """Assemble the uploaded chunks into the final file"""
+    upload = get_object_or_404(DirectUpload, token=token, user=request.user, consumed_at__isnull=True)
+    try:
+        complete_upload(upload)
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({'token': str(upload.token), 'completed': True})
+
+
 @login_required
 def payment_portal(request):
     """Payment portal view"""
@@ -349,7 +562,8 @@ def payment_portal(request):
         return redirect('languages')
     
     try:
-        application = EnrollmentApplication.objects.get(
+        # Drafts haven't been submitted and can't be paid for
+        application = EnrollmentApplication.objects.exclude(status='draft').get(
             id=application_id,
             user=request.user
         )
@@ -359,7 +573,8 @@ def payment_portal(request):
         
         context = {
             'application': application,
-            'levels': application.levels.all(),
+            # Prices as recorded at submit, which is what the total charges
+            'line_items': application.line_items.select_related('level'),
             'total_amount': application.total_amount,
             'razorpay_key_id': razorpay_key_id,
             'application_id': application.id,
@@ -373,7 +588,13 @@ def payment_portal(request):
 
 @login_required
 def create_payment_order(request):
-    """Create Razorpay order for payment"""
+    """Create Razorpay order for payment
+    
+    Idempotent per application and amount: while the application's last
+    order is younger than RAZORPAY_ORDER_TTL and for the same amount, it is
+    returned again without calling Razorpay. Concurrent requests for one
+    application wait on its row lock, so a burst creates a single order.
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
@@ -383,7 +604,8 @@ def create_payment_order(request):
         if not application_id:
             return JsonResponse({'error': 'Application ID is required'}, status=400)
         
-        application = EnrollmentApplication.objects.get(
+        # Drafts haven't been submitted and can't be paid for
+        application = EnrollmentApplication.objects.exclude(status='draft').get(
             id=application_id,
             user=request.user
         )
@@ -392,95 +614,93 @@ def create_payment_order(request):
         if application.payment_status == 'success':
             return JsonResponse({'error': 'Payment already completed'}, status=400)
         
-        # Initialize Razorpay client
-        razorpay_key_id = getattr(settings, 'RAZORPAY_KEY_ID', '')
-        razorpay_key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
-        
-        if not razorpay_key_id or not razorpay_key_secret:
-            return JsonResponse({'error': 'Payment gateway not configured'}, status=500)
-        
-        client = razorpay.Client(auth=(razorpay_key_id, razorpay_key_secret))
-        
-        # Create order
-        # Convert amount to paise (Razorpay uses smallest currency unit)
-        amount = int(float(application.total_amount) * 100)
-        
-        order_data = {
-            'amount': amount,
-            'currency': 'INR',
-            'receipt': f'IFLA_{application.id}',
-            'notes': {
-                'application_id': str(application.id),
-                'user_email': application.email,
-                'user_name': application.full_name,
+        # Amount in paise (Razorpay uses smallest currency unit)
+        amount = application.amount_in_paise
+        
+        # Double-clicks and retries usually find the order already stored
+        if application.reusable_razorpay_order(amount):
+            return _payment_order_response(application)
+        
+        with transaction.atomic():
+            application = EnrollmentApplication.objects.select_for_update().get(pk=application.pk)
+            if application.payment_status == 'success':
+                return JsonResponse({'error': 'Payment already completed'}, status=400)
+            amount = application.amount_in_paise
+            # Another request may have created the order while we waited for the lock
+            if application.reusable_razorpay_order(amount):
+                return _payment_order_response(application)
+            
+            order_data = {
+                'amount': amount,
+                'currency': 'INR',
+                'receipt': f'IFLA_{application.id}',
+                'notes': {
+                    'application_id': str(application.id),
+                    'user_email': application.email,
+                    'user_name': application.full_name,
+                }
             }
-        }
-        
-        order = client.order.create(data=order_data)
-        
-        # Save order ID to application
-        application.razorpay_order_id = order['id']
-        application.payment_status = 'pending'
-        application.status = 'payment_pending'
-        application.save()
-        
-        return JsonResponse({
-            'order_id': order['id'],
-            'amount': order['amount'],
-            'currency': order['currency'],
-            'key_id': razorpay_key_id,
-        })
+            
+            # The row stays locked for the call; the client's timeouts bound the wait
+            order = create_order(order_data)
+            
+            # Save order ID to application
+            application.razorpay_order_id = order['id']
+            application.razorpay_order_amount = order['amount']
+            application.razorpay_order_created_at = timezone.now()
+            application.payment_status = 'pending'
+            application.status = 'payment_pending'
+            application.save(update_fields=[
+                'razorpay_order_id', 'razorpay_order_amount', 'razorpay_order_created_at',
+                'payment_status', 'status', 'updated_at',
+            ])
+        
+        return _payment_order_response(application)
         
     except EnrollmentApplication.DoesNotExist:
         return JsonResponse({'error': 'Application not found'}, status=404)
+    except GatewayNotConfigured as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    except GatewayUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _payment_order_response(application):
+    """Checkout parameters for the application's stored Razorpay order"""
+    return JsonResponse({
+        'order_id': application.razorpay_order_id,
+        'amount': application.razorpay_order_amount,
+        'currency': 'INR',
+        'key_id': settings.RAZORPAY_KEY_ID,
+    })
+
+
 @csrf_exempt
 def payment_webhook(request):
-    """Handle Razorpay webhook callbacks"""
+    """Handle Razorpay webhook callbacks
+    
+    Verified events are stored and acknowledged at once; process_webhooks
+    applies them (see courses/webhooks.py).
+    """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret:
+        print("Razorpay webhook received but RAZORPAY_WEBHOOK_SECRET is not set", file=sys.stderr)
+        return JsonResponse({'error': 'Webhook not configured'}, status=500)
+    
+    if not verify_signature(request.body, request.headers.get('X-Razorpay-Signature'), secret):
+        return JsonResponse({'error': 'Invalid signature'}, status=400)
+    
     try:
-        # Get webhook data
-        webhook_data = json.loads(request.body)
-        event = webhook_data.get('event')
-        payload = webhook_data.get('payload', {})
-        payment = payload.get('payment', {})
-        order = payload.get('order', {})
-        
-        # Verify webhook signature (recommended for production)
-        razorpay_key_secret = getattr(settings, 'RAZORPAY_KEY_SECRET', '')
-        
-        # Find application by order ID
-        order_id = order.get('id') or payment.get('order_id')
-        if order_id:
-            try:
-                application = EnrollmentApplication.objects.get(razorpay_order_id=order_id)
-                
-                if event == 'payment.captured':
-                    # Payment successful
-                    application.payment_status = 'success'
-                    application.payment_reference = payment.get('id', '')
-                    application.razorpay_payment_id = payment.get('id', '')
-                    application.status = 'submitted'  # Change back to submitted after payment
-                    application.paid_at = timezone.now()
-                    application.save()
-                    
-                elif event == 'payment.failed':
-                    # Payment failed
-                    application.payment_status = 'failed'
-                    application.save()
-                    
-            except EnrollmentApplication.DoesNotExist:
-                pass
-        
-        return JsonResponse({'status': 'ok'})
-        
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+        record_event(request.body, request.headers.get('X-Razorpay-Event-Id', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
+    
+    return JsonResponse({'status': 'ok'})
 
 
 @login_required
@@ -492,7 +712,8 @@ def payment_success(request):
         return redirect('languages')
     
     try:
-        application = EnrollmentApplication.objects.get(
+        # Drafts haven't been submitted and can't be paid for
+        application = EnrollmentApplication.objects.exclude(status='draft').get(
             id=application_id,
             user=request.user
         )
@@ -501,26 +722,12 @@ def payment_success(request):
         application.status = 'approved'
         application.payment_status = 'success'
         application.paid_at = timezone.now()
-        application.save()
-        
-        # Create Enrollment records for each course level in the application
-        # This makes them appear in the "Enrolled Courses" section of the dashboard
-        levels = application.levels.all()
-        created_enrollments = []
-        
-        for level in levels:
-            # Check if enrollment already exists (avoid duplicates)
-            enrollment, created = Enrollment.objects.get_or_create(
-                user=request.user,
-                course_level=level,
-                defaults={
-                    'status': 'active',  # Set to active since payment is successful
-                    'progress_percentage': 0,
-                }
-            )
+        with transaction.atomic():
+            application.save()
             
-            if created:
-                created_enrollments.append(enrollment)
+            # Create Enrollment records for each course level in the application
+            # This makes them appear in the "Enrolled Courses" section of the dashboard
+            provision_enrollments([application])
         
         # Redirect to dashboard where enrollments will now be visible
         return redirect(reverse('dashboard'))
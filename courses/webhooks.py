@@ -0,0 +1,128 @@
+"""
+Razorpay webhook inbox.
+
+payment_webhook only checks the X-Razorpay-Signature HMAC and appends the
+event to WebhookEvent, deduplicated on Razorpay's X-Razorpay-Event-Id, with
+a single INSERT. It answers within milliseconds and never touches
+applications, so a burst of deliveries doesn't hold web workers and a
+Razorpay retry of an event already stored is a no-op.
+
+`manage.py process_webhooks` applies the stored events in batches. Batches
+are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several workers can
+run side by side, and the applications they touch are locked while the
+batch is applied. An event that fails is retried on later batches until
+MAX_ATTEMPTS; its error is kept in last_error.
+"""
+import hashlib
+import hmac
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EnrollmentApplication, WebhookEvent
+
+MAX_ATTEMPTS = 5
+
+CAPTURED_EVENTS = ('payment.captured', 'order.paid')
+FAILED_EVENTS = ('payment.failed',)
+
+
+def verify_signature(body, signature, secret):
+    """Whether signature is the hex HMAC-SHA256 of the raw body under the webhook secret"""
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def record_event(body, event_id=''):
+    """Append a verified delivery to the inbox; repeats of a stored event id are ignored.
+
+    Raises ValueError if the body isn't a JSON object.
+    """
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('Webhook body must be a JSON object')
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(
+            # Deliveries without the header are deduplicated on their content
+            event_id=event_id or hashlib.sha256(body).hexdigest(),
+            event=str(payload.get('event', ''))[:100],
+            payload=payload,
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def _entity(payload, name):
+    entity = (payload.get('payload') or {}).get(name) or {}
+    return entity.get('entity', entity)
+
+
+def event_order_id(event):
+    """The Razorpay order id an event is about, or ''"""
+    payment = _entity(event.payload, 'payment')
+    order = _entity(event.payload, 'order')
+    return order.get('id') or payment.get('order_id') or ''
+
+
+def apply_event(event, application):
+    """Update the application an event is about; events for unknown orders are dropped"""
+    if application is None:
+        return
+    payment = _entity(event.payload, 'payment')
+    if event.event in CAPTURED_EVENTS and application.payment_status != 'success':
+        application.payment_status = 'success'
+        application.payment_reference = payment.get('id', '')
+        application.razorpay_payment_id = payment.get('id', '')
+        if application.status == 'payment_pending':
+            application.status = 'submitted'  # Change back to submitted after payment
+        application.paid_at = timezone.now()
+        application.save(update_fields=[
+            'payment_status', 'payment_reference', 'razorpay_payment_id', 'status', 'paid_at', 'updated_at',
+        ])
+    elif event.event in FAILED_EVENTS and application.payment_status not in ('success', 'refunded'):
+        # A late failure of an earlier attempt must not undo a capture
+        application.payment_status = 'failed'
+        application.save(update_fields=['payment_status', 'updated_at'])
+
+
+def process_batch(batch_size=100, after_id=0):
+    """Apply up to batch_size pending events with ids above after_id, in arrival order.
+
+    Returns the id of the last event claimed, or None when there are none;
+    pass it as after_id to move on, so a failing event is retried on the
+    next pass over the inbox rather than straight away.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS, id__gt=after_id)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return None
+
+        order_ids = {event_order_id(event) for event in events} - {''}
+        # Locked, so payment_success or an admin approval can't change the
+        # status between this read and apply_event's save
+        applications = {
+            application.razorpay_order_id: application
+            for application in EnrollmentApplication.objects.select_for_update().filter(razorpay_order_id__in=order_ids)
+        }
+        now = timezone.now()
+        for event in events:
+            application = applications.get(event_order_id(event))
+            try:
+                # A savepoint per event, so one bad event doesn't undo the batch
+                with transaction.atomic():
+                    apply_event(event, application)
+            except Exception as e:
+                event.attempts += 1
+                event.last_error = str(e)
+                if application is not None:
+                    # Drop the changes that were rolled back
+                    application.refresh_from_db()
+            else:
+                event.processed_at = now
+        WebhookEvent.objects.bulk_update(events, ['processed_at', 'attempts', 'last_error'])
+    return events[-1].id
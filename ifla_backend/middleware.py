@@ -0,0 +1,61 @@
+"""
+Static file serving tweaks on top of WhiteNoise.
+
+WhiteNoise answers Range requests by wrapping the open file in a SlicedFile,
+which hides the file descriptor from the WSGI server. Gunicorn can only use
+sendfile() when it can see a real descriptor, so every partial response for
+the hero video (browsers fetch video almost entirely through Range requests)
+was copied through the worker in Python-sized chunks.
+
+RangeWhiteNoiseMiddleware keeps the slice semantics for servers that read
+the file, but exposes the descriptor so gunicorn can hand the byte range to
+the kernel. Gunicorn sends exactly Content-Length bytes from the current
+file offset, which SlicedFile has already moved to the start of the range.
+"""
+from whitenoise.middleware import WhiteNoiseFileResponse, WhiteNoiseMiddleware
+from whitenoise.responders import SlicedFile
+
+
+class SendfileSlicedFile:
+    """Wraps a SlicedFile so the WSGI server can sendfile() the underlying file.
+
+    Reads still go through the slice, so servers without sendfile() support
+    stop at the end of the range as before.
+    """
+
+    def __init__(self, sliced):
+        self.sliced = sliced
+
+    def read(self, size=-1):
+        return self.sliced.read(size)
+
+    def close(self):
+        self.sliced.close()
+
+    def fileno(self):
+        return self.sliced.fileobj.fileno()
+
+    def seek(self, offset, whence=0):
+        # socket.sendfile() seeks past the bytes it sent once it is done
+        return self.sliced.fileobj.seek(offset, whence)
+
+    def tell(self):
+        return self.sliced.fileobj.tell()
+
+
+class RangeWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise middleware whose partial responses are sendfile()-able"""
+
+    @staticmethod
+    def serve(static_file, request):
+        response = static_file.get_response(request.method, request.META)
+        file_handle = response.file
+        if isinstance(file_handle, SlicedFile):
+            # The slice has already seeked to the first byte of the range
+            file_handle = SendfileSlicedFile(file_handle)
+        http_response = WhiteNoiseFileResponse(file_handle or (), status=int(response.status))
+        # Remove default content-type
+        del http_response['content-type']
+        for key, value in response.headers:
+            http_response[key] = value
+        return http_response
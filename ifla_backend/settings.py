@@ -4,6 +4,7 @@ Django settings for ifla_backend project.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -66,7 +67,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add WhiteNoise for static files
+    'ifla_backend.middleware.RangeWhiteNoiseMiddleware',  # WhiteNoise, with sendfile() for Range requests
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -143,6 +144,35 @@ else:
     }
 
 
+# Cache
+# Must be shared by every process that reads or bumps the version stamps
+# (catalog, dashboard fragments): the gunicorn workers, the webhook worker
+# and the cron jobs. On Render those are separate services, so with
+# DATABASE_URL the cache lives in the database (`manage.py createcachetable`,
+# run by build.sh). Locally a file cache is shared by all processes on the
+# machine; set CACHE_DIR to move it off the temp directory.
+if database_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ifla_cache')),
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -190,6 +220,12 @@ STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Enrollment documents are uploaded by the browser in resumable chunks
+# straight to media storage (see courses/uploads.py). With S3 the bucket's
+# CORS rules must allow PUT from the site. Set to false to post files with
+# the form instead.
+DIRECT_UPLOADS = os.getenv('DIRECT_UPLOADS', 'True').lower() == 'true'
+
 # Optional: Use S3 for media in production
 USE_S3_MEDIA = os.getenv('USE_S3_MEDIA', 'False').lower() == 'true'
 if USE_S3_MEDIA or os.getenv('AWS_STORAGE_BUCKET_NAME'):
@@ -337,3 +373,22 @@ RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
 # RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID')
 # RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET')
 
+# Razorpay API client (courses/payments.py): one pooled client per process.
+# Point RAZORPAY_BASE_URL at `manage.py razorpay_stub` to work offline.
+RAZORPAY_BASE_URL = os.getenv('RAZORPAY_BASE_URL', 'https://api.razorpay.com')
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', '3.05'))
+RAZORPAY_READ_TIMEOUT = float(os.getenv('RAZORPAY_READ_TIMEOUT', '10'))
+RAZORPAY_MAX_RETRIES = int(os.getenv('RAZORPAY_MAX_RETRIES', '2'))
+RAZORPAY_POOL_SIZE = int(os.getenv('RAZORPAY_POOL_SIZE', '10'))
+# Consecutive failures that open the circuit, and seconds before it is retried
+RAZORPAY_BREAKER_THRESHOLD = int(os.getenv('RAZORPAY_BREAKER_THRESHOLD', '5'))
+RAZORPAY_BREAKER_RESET = float(os.getenv('RAZORPAY_BREAKER_RESET', '30'))
+# Secret set on the webhook in the Razorpay dashboard (not the API key secret)
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', '')
+# Seconds an application's Razorpay order is reused instead of creating another
+RAZORPAY_ORDER_TTL = int(os.getenv('RAZORPAY_ORDER_TTL', '3600'))
+
+# Tax on course fees as a fraction of the price (e.g. 0.18 for 18% GST),
+# recorded per level on the application's line items when it is submitted
+APPLICATION_TAX_RATE = os.getenv('APPLICATION_TAX_RATE', '0')
+